@@ -33,5 +33,5 @@ __author__ = """2009, 2010 Thomas Jost <thomas.jost@gmail.com>
 2016 Epithumia <endless@airelle.info>
 """
 
-__all__ = ['app', 'builder', 'config', 'document', 'editable_label', 'extras', 'media_overlays', 'pointer', 'scribble',
-           'surfacecache', 'talk_time', 'ui', 'util']
+__all__ = ['app', 'batch', 'benchmark', 'builder', 'config', 'document', 'editable_label', 'extras', 'media_overlays',
+           'metrics', 'overview', 'pointer', 'render', 'scribble', 'surfacecache', 'talk_time', 'ui', 'util']
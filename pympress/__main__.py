@@ -31,14 +31,21 @@ import os
 import sys
 import locale
 import gettext
+import multiprocessing
 
 from pympress import util
 
 
-# Setup logging, and catch all uncaught exceptions in the log file.
-# Load pympress.util early (OS and path-specific things) to load and setup gettext translation asap.
+# Nothing that has side effects happens at import time: rendering worker processes are spawned by re-importing
+# the main module, and they must neither log to pympress’ log file nor load Gtk.
 logger = logging.getLogger(__name__)
-logging.basicConfig(filename=util.get_log_path(), level=logging.DEBUG)
+
+
+try:
+    # python 2.7 does not have this
+    ModuleNotFoundError
+except NameError:
+    ModuleNotFoundError = ImportError
 
 
 def uncaught_handler(*exc_info):
@@ -48,60 +55,72 @@ def uncaught_handler(*exc_info):
     sys.__excepthook__(*exc_info)
 
 
-sys.excepthook = uncaught_handler
-
-
-if util.IS_WINDOWS:
-    if os.getenv('LANG') is None:
-        lang, enc = locale.getdefaultlocale()
-        os.environ['LANG'] = lang
-
-locale.setlocale(locale.LC_ALL, '')
-gettext.install('pympress', util.get_locale_dir())
+def setup():
+    """ Setup logging, catch all uncaught exceptions in the log file, and install the gettext translation.
+    """
+    logging.basicConfig(filename=util.get_log_path(), level=logging.DEBUG)
+    sys.excepthook = uncaught_handler
 
+    if util.IS_WINDOWS:
+        if os.getenv('LANG') is None:
+            lang, enc = locale.getdefaultlocale()
+            os.environ['LANG'] = lang
 
-try:
-    # python 2.7 does not have this
-    ModuleNotFoundError
-except NameError:
-    ModuleNotFoundError = ImportError
+    locale.setlocale(locale.LC_ALL, '')
+    gettext.install('pympress', util.get_locale_dir())
 
 
-# Load python bindings for gobject introspections, aka pygobject, aka gi, and pycairo.
-# These are dependencies that are not specified in the setup.py, so we need to start here.
-# They are not specified because:
-# - installing those via pip requires compiling (always for pygobject, if no compatible wheels exist for cairo),
-# - compiling requires a compiling toolchain, development packages of the libraries, etc.,
-# - all of this makes more sense to be handled by the OS package manager,
-# - it is hard to make pretty error messages pointing this out at `pip install` time,
-#   as they would have to be printed when the dependency resolution happens.
-# See https://github.com/Cimbali/pympress/issues/100
-try:
-    import gi
-    gi.require_version('Gtk', '3.0')
-    from gi.repository import Gtk, Gdk, GLib, Gio
-    import cairo
-except ModuleNotFoundError:
-    logger.critical('Gobject Introspections and/or pycairo module is missing', exc_info = True)
-    print('\n' + _('ERROR: Gobject Introspections and/or pycairo module is missing, ' +
-                   'make sure Gtk, pygobject and pycairo are installed on your system.') + '\n')
-    print(_('Try your operating system’s package manager, or try running: pip install pygobject pycairo'))
-    print(_('pip will then download and compile pygobject and pycairo, ' +
-            'for which you need the Gtk and cairo headers (or development packages).') + '\n')
-    print(_('For instructions, refer to https://github.com/Cimbali/pympress/blob/master/README.md#dependencies'))
-    print(_('If using a virtualenv or anaconda, you can also try allowing system site packages.'))
-    print()
-    exit(1)
+def check_dependencies():
+    """ Load python bindings for gobject introspections, aka pygobject, aka gi, and pycairo, or exit.
 
+    These are dependencies that are not specified in the setup.py, so we need to start here.
+    They are not specified because:
 
+    - installing those via pip requires compiling (always for pygobject, if no compatible wheels exist for cairo),
+    - compiling requires a compiling toolchain, development packages of the libraries, etc.,
+    - all of this makes more sense to be handled by the OS package manager,
+    - it is hard to make pretty error messages pointing this out at `pip install` time,
+      as they would have to be printed when the dependency resolution happens.
 
-# Finally the real deal: load pympress modules, handle command line args, and start up
-from pympress import app
+    See https://github.com/Cimbali/pympress/issues/100
+    """
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk, Gdk, GLib, Gio
+        import cairo
+    except ModuleNotFoundError:
+        logger.critical('Gobject Introspections and/or pycairo module is missing', exc_info = True)
+        print('\n' + _('ERROR: Gobject Introspections and/or pycairo module is missing, ' +
+                       'make sure Gtk, pygobject and pycairo are installed on your system.') + '\n')
+        print(_('Try your operating system’s package manager, or try running: pip install pygobject pycairo'))
+        print(_('pip will then download and compile pygobject and pycairo, ' +
+                'for which you need the Gtk and cairo headers (or development packages).') + '\n')
+        print(_('For instructions, refer to https://github.com/Cimbali/pympress/blob/master/README.md#dependencies'))
+        print(_('If using a virtualenv or anaconda, you can also try allowing system site packages.'))
+        print()
+        exit(1)
 
 
 def main(argv = sys.argv[:]):
     """ Entry point of pympress. Parse command line arguments, instantiate the UI, and start the main loop.
+
+    ``pympress render [options] file.pdf`` instead renders the pages of a document without any window,
+    see :mod:`~pympress.batch`.
     """
+    # Rendering worker processes are spawned by re-running this executable in frozen packages
+    multiprocessing.freeze_support()
+
+    # Setup logging and the gettext translation before anything else
+    setup()
+    check_dependencies()
+
+    if argv[1:2] == ['render']:
+        from pympress import batch
+        exit(batch.main(argv[2:]))
+
+    # Finally the real deal: load pympress modules, handle command line args, and start up
+    from pympress import app
     app.Pympress().run(argv)
 
 
@@ -29,6 +29,7 @@ from __future__ import print_function, unicode_literals
 import logging
 logger = logging.getLogger(__name__)
 
+import os
 import signal
 import platform
 
@@ -37,7 +38,7 @@ import cairo
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GLib, Gio
 
-from pympress import util, config, document, ui, builder
+from pympress import util, config, document, ui, builder, metrics
 
 
 class Pympress(Gtk.Application):
@@ -51,12 +52,15 @@ class Pympress(Gtk.Application):
     action_startup_queue = []
     #: `bool` to automatically upgrade log level (DEBUG / INFO at init, then ERROR), False if user set log level
     auto_log_level = True
+    #: `str` path of the file to which metrics are written on exit, given on the command line, or `None`
+    metrics_file = None
 
     options = {
         # long_name:  (short_name (int), flags (GLib.OptionFlags), arg (GLib.OptionArg)
         'talk-time':  (ord('t'), GLib.OptionFlags.NONE, GLib.OptionArg.STRING),
         'notes':      (ord('N'), GLib.OptionFlags.NONE, GLib.OptionArg.STRING),
         'log':        (0,        GLib.OptionFlags.NONE, GLib.OptionArg.STRING),
+        'metrics':    (0,        GLib.OptionFlags.NONE, GLib.OptionArg.STRING),
         'version':    (ord('v'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE),
         'pause':      (ord('P'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE),
         'reset':      (ord('r'), GLib.OptionFlags.NONE, GLib.OptionArg.NONE),
@@ -77,6 +81,7 @@ class Pympress(Gtk.Application):
                       _('Overrides the detection from the file.'), '<position>'),
         'log':       (_('Set level of verbosity in log file:') + ' ' +
                       _('{}, {}, {}, {}, or {}').format('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'), '<level>'),
+        'metrics':   (_('Collect performance metrics, and write them to the given file on exit'), '<file>'),
         'version':   (_('Print version and exit'), None),
         'pause':     (_('Toggle pause of talk timer'), None),
         'reset':     (_('Reset talk timer'), None),
@@ -132,6 +137,10 @@ class Pympress(Gtk.Application):
         """
         self.config = config.Config()
 
+        metrics.slow_threshold = self.config.getint('metrics', 'slow_threshold', fallback=40) / 1000
+        if self.config.getboolean('metrics', 'enabled', fallback=False):
+            metrics.enable()
+
         # prefere X11 on posix systems because Wayland still has some shortcomings for us,
         # specifically libVLC and the ability to disable screensavers
         if util.IS_POSIX:
@@ -232,6 +241,10 @@ class Pympress(Gtk.Application):
         if self.gui is not None:
             self.gui.cleanup()
 
+            if metrics.enabled:
+                metrics.export(self.metrics_file or self.config.get('metrics', 'file', fallback='') or
+                               os.path.join(util.get_cache_path(), 'metrics.json'))
+
         self.config.save_config()
         Gtk.Application.do_shutdown(self)
 
@@ -239,11 +252,15 @@ class Pympress(Gtk.Application):
     def set_log_level(self, action, param):
         """ Action that sets the logging level (on the root logger of the active instance)
 
+        Debug logging also starts collecting performance :mod:`~pympress.metrics`.
+
         Args:
             action (:class:`~Gio.Action`): The action activatd
             param (:class:~`GLib.Variant`): The desired level as an int wrapped in a GLib.Variant
         """
         logging.getLogger(None).setLevel(param.get_int64())
+        if param.get_int64() <= logging.DEBUG:
+            metrics.enable()
         action.change_state(param)
 
 
@@ -282,6 +299,10 @@ class Pympress(Gtk.Application):
                         arg, "DEBUG, INFO, WARNING, ERROR, CRITICAL"
                     ))
 
+            elif opt == "metrics":
+                self.metrics_file = os.path.abspath(arg)
+                metrics.enable()
+
             elif opt == "notes":
                 arg = arg.lower()[:1]
                 if arg == 'n': self.activate_action('notes-pos', 'none')
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+#       batch.py
+#
+#       Copyright 2015 Cimbali <me@cimba.li>
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+:mod:`pympress.batch` -- non-interactive rendering of whole documents
+---------------------------------------------------------------------
+
+This module implements ``pympress render``, which rasterizes all the pages of a document at the given sizes and
+page types, either to PNG files, e.g. to archive slides as images, or to the disk cache of rendered pages,
+so that a presentation shows up immediately when opened later on.
+
+Pages are rendered by a pool of worker processes, each of which opens the document, renders one page at
+a time, and writes it out directly, so that the whole document is never held in memory.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import sys
+import argparse
+import pathlib
+import multiprocessing
+
+from pympress import config, document, render, surfacecache, util
+
+
+#: `dict` mapping the names of page types accepted on the command line to :class:`~pympress.document.PdfPage`
+modes = {mode.name.lower(): mode for mode in document.PdfPage if mode != document.PdfPage.NONE}
+
+
+def fit_size(page, mode, width, height):
+    """ Shrink an area to the aspect ratio of a page, as the frames of pympress’ windows do.
+
+    Args:
+        page (:class:`~pympress.document.Page`): the page to display
+        mode (:class:`~pympress.document.PdfPage`): the type of page to display
+        width (`int`): width of the available area
+        height (`int`): height of the available area
+
+    Returns:
+        `tuple`: the width and height of the area in which the page is displayed
+    """
+    ratio = page.get_aspect_ratio(mode)
+    if ratio * height > width:
+        return width, max(1, int(width / ratio + .5))
+    else:
+        return max(1, int(height * ratio + .5)), height
+
+
+def page_numbers(nb_pages, mode):
+    """ Get the pages that can be displayed with a given page type.
+
+    With notes after the slides, only the first half of the pages are slides and the second half are notes.
+
+    Args:
+        nb_pages (`int`): the number of pages in the document
+        mode (:class:`~pympress.document.PdfPage`): the type of page to display
+
+    Returns:
+        `range`: the page numbers
+    """
+    if mode == document.PdfPage.BEFORE:
+        return range(nb_pages // 2)
+    elif mode == document.PdfPage.AFTER:
+        return range(nb_pages // 2, nb_pages)
+    else:
+        return range(nb_pages)
+
+
+def render_job(uri, page_nb, mode, size, scale, fit, png_pattern, cache_dir):
+    """ Render a page in a worker process, and write it to a PNG file and/or the disk cache.
+
+    Args:
+        uri (`str`): URI of the document
+        page_nb (`int`): number of the page to render
+        mode (`int`): the :class:`~pympress.document.PdfPage` type of the page to render
+        size (`tuple`): width and height of the area in which the page is displayed
+        scale (`int`): number of device pixels per logical pixel
+        fit (`bool`): whether to shrink the area to the page’s aspect ratio
+        png_pattern (`str`): format string for the path of the PNG file, or `None` to not write PNG files
+        cache_dir (`str`): the disk cache directory of the document, or `None` to not write to the disk cache
+
+    Returns:
+        `tuple`: the page number and the size of the rendered page
+    """
+    mode = document.PdfPage(mode)
+    page = render.worker_renderer((uri, 0)).doc.page(page_nb)
+    ww, wh = fit_size(page, mode, *size) if fit else size
+
+    surface = render.create_surface(ww, wh, scale)
+    render.render_page(page, surface, ww, wh, mode)
+
+    if png_pattern is not None:
+        surface.write_to_png(png_pattern.format(page = page_nb + 1, mode = mode.name.lower(), width = ww,
+                                                height = wh, scale = scale))
+
+    if cache_dir is not None:
+        name = surfacecache.DiskCache.page_filename(page_nb, mode, surface.get_width(), surface.get_height(), scale)
+        surfacecache.DiskCache.write_file(os.path.join(cache_dir, name), bytes(surface.get_data()))
+
+    surface.finish()
+    return page_nb, (ww, wh)
+
+
+def parse_size(text):
+    """ Parse a size given on the command line.
+
+    Args:
+        text (`str`): the size, as WIDTHxHEIGHT
+
+    Returns:
+        `tuple`: the width and height, as `int`
+    """
+    try:
+        width, height = (int(n) for n in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(_('expected WIDTHxHEIGHT, got {}').format(text))
+    return width, height
+
+
+def main(argv):
+    """ Render the pages of a document, as requested by the command line arguments.
+
+    Args:
+        argv (`list` of `str`): the command line arguments following ``pympress render``
+
+    Returns:
+        `int`: the exit status
+    """
+    parser = argparse.ArgumentParser(prog = 'pympress render',
+                                     description = _('Render all pages of a document to PNG files '
+                                                     'and/or to the disk cache of rendered pages.'))
+    parser.add_argument('file', help = _('the PDF file to render'))
+    parser.add_argument('-s', '--size', type = parse_size, action = 'append',
+                        help = _('size of the area in which pages are displayed, as WIDTHxHEIGHT, '
+                                 'can be repeated (default: 1920x1080)'))
+    parser.add_argument('-m', '--mode', choices = sorted(modes), action = 'append',
+                        help = _('part of the pages to render, can be repeated '
+                                 '(default: the slides, and the notes if any are detected)'))
+    parser.add_argument('--scale', type = int, default = 1, help = _('number of pixels per logical pixel'))
+    parser.add_argument('--no-fit', dest = 'fit', action = 'store_false',
+                        help = _('render pages at exactly the given sizes, instead of shrinking the sizes '
+                                 'to the aspect ratio of the pages as pympress’ windows do'))
+    parser.add_argument('-o', '--output', help = _('directory in which to write PNG files'))
+    parser.add_argument('-c', '--cache', action = 'store_true', help = _('store pages in the disk cache'))
+    parser.add_argument('-j', '--processes', type = int, default = os.cpu_count() or 1,
+                        help = _('number of worker processes (default: number of CPUs)'))
+    args = parser.parse_args(argv)
+
+    if args.output is None and not args.cache:
+        parser.error(_('nothing to do, use --output and/or --cache'))
+
+    path = pathlib.Path(args.file).resolve()
+    uri = path.as_uri()
+    doc = document.Document.create(None, uri)
+    sizes = args.size or [(1920, 1080)]
+
+    if args.mode:
+        page_modes = [modes[name] for name in args.mode]
+    else:
+        notes = doc.guess_notes('right', 'bottom')
+        page_modes = [notes.complement(), notes] if notes else [document.PdfPage.FULL]
+
+    png_pattern = None
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok = True)
+        digits = len(str(doc.pages_number()))
+        png_pattern = os.path.join(args.output, path.stem + '-{page:0' + str(digits) + 'd}-{mode}-{width}x{height}' +
+                                   ('@{scale}' if args.scale != 1 else '') + '.png')
+
+    disk_cache = None
+    if args.cache:
+        disk_size = config.Config().getint('cache', 'disk_size', fallback = 0) << 20
+        if disk_size <= 0:
+            print(_('The disk cache is disabled, set disk_size in the cache section of the configuration file'),
+                  file = sys.stderr)
+            return 1
+
+        disk_cache = surfacecache.DiskCache(os.path.join(util.get_cache_path(), 'pages'), disk_size)
+        disk_cache.swap_document(uri)
+        disk_cache.flush()
+
+    jobs = [(uri, page_nb, int(mode), size, args.scale, args.fit, png_pattern,
+             disk_cache.doc_dir if disk_cache is not None else None)
+            for mode in page_modes for size in sizes for page_nb in page_numbers(doc.pages_number(), mode)]
+    doc.cleanup_media_files()
+
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(max(1, args.processes), initializer = render.init_worker) as pool:
+        for done, result in enumerate(pool.imap_unordered(render_job, jobs), 1):
+            print('\r' + _('Rendered {} of {} pages').format(done, len(jobs)), end = '', file = sys.stderr)
+    print(file = sys.stderr)
+
+    if disk_cache is not None:
+        disk_cache.trim()
+        disk_cache.close()
+
+    return 0
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+#
+#       benchmark.py
+#
+#       Copyright 2015 Cimbali <me@cimba.li>
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+:mod:`pympress.benchmark` -- headless rendering benchmarks
+----------------------------------------------------------
+
+This module measures how fast pympress opens, renders and navigates documents, without any window:
+pages are rendered with :mod:`pympress.render` and navigation goes through a
+:class:`~pympress.surfacecache.SurfaceCache` driven by the GLib main loop, so it runs without a display.
+
+Run it with ``python -m pympress.benchmark [options] [file.pdf ...]``. Besides the given files, it generates
+synthetic decks (beamer-like with overlays, notes after the slides, notes on the right, image-heavy, and
+a 1000 pages document) unless ``--no-synthetic`` is passed. Results are written as JSON, so that they can be
+compared across versions.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import gettext
+import argparse
+import platform
+import tempfile
+import pathlib
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+import gi
+import cairo
+gi.require_version('Poppler', '0.18')
+from gi.repository import GLib, Poppler
+
+import pympress
+from pympress import document, metrics, render, surfacecache, util
+
+
+#: `tuple` of the percentiles of the rendering latency to report
+percentiles = (50, 90, 99)
+
+
+class HeadlessWidget(object):
+    """ Stands in for a drawing area of the GUI, so that a :class:`~pympress.surfacecache.SurfaceCache` can be used
+    without windows. Surfaces for such widgets are plain :class:`~cairo.ImageSurface`.
+
+    Args:
+        name (`str`): the name of the widget
+    """
+    #: `str` name of the widget, used as key in the caches
+    name = None
+
+    def __init__(self, name):
+        self.name = name
+
+
+    def get_name(self):
+        """ Get the name of the widget.
+
+        Returns:
+            `str`: the name of the widget
+        """
+        return self.name
+
+
+    def get_window(self):
+        """ Get the window of the widget, which headless widgets do not have.
+
+        Returns:
+            `None`: always
+        """
+        return None
+
+
+
+def peak_rss():
+    """ Get the maximum resident set size of the process so far.
+
+    Returns:
+        `int`: the number of bytes, or `None` if it can not be measured on this platform
+    """
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def summarize(latencies):
+    """ Summarize a list of durations.
+
+    Args:
+        latencies (`list` of `float`): durations in seconds
+
+    Returns:
+        `dict`: the number of samples, the mean, maximum and :attr:`percentiles` in milliseconds
+    """
+    if not latencies:
+        return {'count': 0}
+
+    latencies = sorted(latencies)
+    summary = {'count': len(latencies), 'mean_ms': 1000 * sum(latencies) / len(latencies),
+               'max_ms': 1000 * latencies[-1]}
+    for p in percentiles:
+        # nearest-rank percentile
+        rank = max(0, -(-p * len(latencies) // 100) - 1)
+        summary['p{}_ms'.format(p)] = 1000 * latencies[rank]
+
+    return summary
+
+
+def sample_pages(nb_pages, count):
+    """ Pick at most ``count`` page numbers, evenly spread over the document.
+
+    Args:
+        nb_pages (`int`): the number of pages in the document
+        count (`int`): the maximum number of pages to pick
+
+    Returns:
+        `list` of `int`: page numbers
+    """
+    if nb_pages <= count:
+        return list(range(nb_pages))
+    return sorted({n * nb_pages // count for n in range(count)})
+
+
+def navigation(nb_pages, steps):
+    """ Build a presentation-like sequence of pages: mostly forward, going back a page now and then.
+
+    Args:
+        nb_pages (`int`): the number of pages in the document
+        steps (`int`): the maximum number of page changes
+
+    Returns:
+        `list` of `int`: the page numbers shown, in order
+    """
+    rng = random.Random(nb_pages)
+    pages, page = [0], 0
+    while len(pages) < steps and page < nb_pages - 1:
+        page = max(0, page - 1) if rng.random() < .1 else page + 1
+        pages.append(page)
+    return pages
+
+
+def render_modes(doc):
+    """ Get the page types to render for a document, depending on where its notes are.
+
+    Args:
+        doc (:class:`~pympress.document.Document`): the document
+
+    Returns:
+        `list` of :class:`~pympress.document.PdfPage`: the modes to benchmark
+    """
+    notes = doc.guess_notes('right', 'bottom')
+    if notes == document.PdfPage.NONE:
+        return [document.PdfPage.FULL]
+    return [document.PdfPage.FULL, notes, notes.complement()]
+
+
+def bench_rendering(doc, mode, size, count):
+    """ Measure the latency of rendering pages of a document in a given mode, without any cache.
+
+    Args:
+        doc (:class:`~pympress.document.Document`): the document
+        mode (:class:`~pympress.document.PdfPage`): the type of page to render
+        size (`tuple`): width and height of the area in which pages are rendered
+        count (`int`): the maximum number of pages to render
+
+    Returns:
+        `dict`: the summary of latencies, see :func:`summarize`
+    """
+    # As in the GUI, the notes are the second half of the pages, in AFTER mode, and slides the first half, in BEFORE
+    doc.set_notes_after(mode.direction() == 'page number')
+    get_page = doc.notes_page if mode == document.PdfPage.AFTER else doc.page
+
+    ww, wh = size
+    latencies = []
+    for page_nb in sample_pages(doc.pages_number(), count):
+        page = get_page(page_nb)
+        surface = render.create_surface(ww, wh)
+        latencies.append(render.render_page(page, surface, ww, wh, mode))
+
+    doc.set_notes_after(False)
+    return summarize(latencies)
+
+
+def bench_navigation(doc, size, steps, dwell, max_memory, processes):
+    """ Replay a presentation through a :class:`~pympress.surfacecache.SurfaceCache`, with prerendering.
+
+    For each page change, the current and next pages are looked up in the cache and rendered synchronously
+    on a miss, as the GUI does. The main loop then runs for ``dwell`` seconds, or until there is nothing left
+    to prerender, before the next page change.
+
+    Args:
+        doc (:class:`~pympress.document.Document`): the document
+        size (`tuple`): width and height of the current page, the next page is half that size
+        steps (`int`): the maximum number of page changes
+        dwell (`float`): number of seconds spent on each page
+        max_memory (`int`): the maximum number of bytes used by the cache
+        processes (`int`): the number of worker processes that render pages
+
+    Returns:
+        `dict`: the cache hits, misses, hit rate, latency of page changes and estimated rendering cost
+    """
+    ww, wh = size
+    cache = surfacecache.SurfaceCache(doc, max_memory, processes)
+    sizes = {'current': (ww, wh), 'next': (ww // 2, wh // 2)}
+    for name, (w, h) in sizes.items():
+        cache.add_widget(HeadlessWidget(name), document.PdfPage.FULL, urgent = name == 'current')
+        cache.resize_widget(name, w, h)
+
+    context = GLib.MainContext.default()
+    hits, misses, latencies = 0, 0, []
+    try:
+        for page_nb in navigation(doc.pages_number(), steps):
+            start = time.monotonic()
+            cache.prerender_around(page_nb)
+
+            for name, shown in (('current', page_nb), ('next', page_nb + 1)):
+                page = doc.page(shown)
+                if page is None:
+                    continue
+                elif cache.get(name, shown) is not None:
+                    hits += 1
+                    continue
+
+                misses += 1
+                w, h = sizes[name]
+                surface = render.create_surface(w, h)
+                render.render_page(page, surface, w, h)
+                cache.set(name, shown, surface)
+
+            latencies.append(time.monotonic() - start)
+
+            deadline = time.monotonic() + dwell
+            while time.monotonic() < deadline:
+                if not context.iteration(False):
+                    if cache.queue_depth() == 0 and not (cache.render_pool and cache.render_pool.pending):
+                        break
+                    time.sleep(.001)
+    finally:
+        cache.shutdown()
+
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+        'page_change': summarize(latencies),
+        'render_cost_ms': 1000 * cache.render_cost if cache.render_cost is not None else None,
+    }
+
+
+def bench_document(uri, args):
+    """ Run all benchmarks on a document.
+
+    Args:
+        uri (`str`): URI of the PDF file to benchmark
+        args (:class:`~argparse.Namespace`): the command line options
+
+    Returns:
+        `dict`: the results of the benchmarks, including the :mod:`~pympress.metrics` collected while running them
+    """
+    metrics.reset()
+    metrics.enable()
+
+    start = time.monotonic()
+    doc = document.Document.create(None, uri)
+    create_time = time.monotonic() - start
+
+    start = time.monotonic()
+    while doc.load_labels():
+        pass
+    has_labels = doc.has_labels()
+    labels_time = time.monotonic() - start
+
+    result = {
+        'uri': uri,
+        'pages': doc.pages_number(),
+        'create_ms': 1000 * create_time,
+        'labels_ms': 1000 * labels_time,
+        'has_labels': has_labels,
+        'render': {mode.name: bench_rendering(doc, mode, args.size, args.pages) for mode in render_modes(doc)},
+        'navigation': bench_navigation(doc, args.size, args.steps, args.dwell, args.cache_memory << 20,
+                                       args.processes),
+    }
+
+    doc.cleanup_media_files()
+    result['metrics'] = metrics.snapshot()
+    result['peak_rss_bytes'] = peak_rss()
+    return result
+
+
+def _draw_slide(context, width, height, number, overlay = 0):
+    """ Draw a synthetic slide: a title, some text, and shapes.
+
+    Args:
+        context (:class:`~cairo.Context`): the context of the PDF surface
+        width (`float`): width of the page in points
+        height (`float`): height of the page in points
+        number (`int`): number of the slide
+        overlay (`int`): number of the overlay of the slide, drawing more items
+    """
+    context.set_source_rgb(.1, .2, .5)
+    context.rectangle(0, 0, width, height * .15)
+    context.fill()
+
+    context.set_source_rgb(1, 1, 1)
+    context.set_font_size(height * .07)
+    context.move_to(width * .05, height * .1)
+    context.show_text('Slide {}'.format(number))
+
+    context.set_source_rgb(0, 0, 0)
+    context.set_font_size(height * .04)
+    for line in range(3 + overlay):
+        context.move_to(width * .08, height * (.3 + .1 * line))
+        context.show_text('Item {}: the quick brown fox jumps over the lazy dog'.format(line + 1))
+
+    for n in range(12):
+        context.set_source_rgb(n / 12, .5, 1 - n / 12)
+        context.arc(width * (.1 + .07 * n), height * .85, height * .04, 0, 6.283)
+        context.fill()
+
+
+def _pdf(directory, name, pages):
+    """ Write a synthetic PDF file, one page at a time.
+
+    Args:
+        directory (`str`): the directory in which to write the file
+        name (`str`): the name of the file, without extension
+        pages (iterable): tuples of (width, height, label, draw function taking a context, width and height)
+
+    Returns:
+        `str`: the URI of the generated file
+    """
+    path = os.path.join(directory, name + '.pdf')
+    surface = cairo.PDFSurface(path, 1, 1)
+    context = cairo.Context(surface)
+    for width, height, label, draw in pages:
+        surface.set_size(width, height)
+        if label is not None and hasattr(surface, 'set_page_label'):
+            surface.set_page_label(label)
+        draw(context, width, height)
+        context.show_page()
+    surface.finish()
+
+    return pathlib.Path(path).resolve().as_uri()
+
+
+def _draw_image(context, width, height, seed):
+    """ Paint a page-sized image of noise, which does not compress.
+
+    Args:
+        context (:class:`~cairo.Context`): the context of the PDF surface
+        width (`float`): width of the page in points
+        height (`float`): height of the page in points
+        seed (`int`): the seed of the noise
+    """
+    image = cairo.ImageSurface(cairo.Format.RGB24, 1024, 768)
+    data = image.get_data()
+    data[:] = random.Random(seed).getrandbits(8 * len(data)).to_bytes(len(data), 'little')
+    del data
+    image.mark_dirty()
+
+    context.save()
+    context.scale(width / 1024, height / 768)
+    context.set_source_surface(image, 0, 0)
+    context.paint()
+    context.restore()
+
+
+def synthetic_decks(directory):
+    """ Generate synthetic documents representative of different kinds of presentations.
+
+    Args:
+        directory (`str`): the directory in which to write the files
+
+    Returns:
+        `dict`: mapping the names of the decks to their URI
+    """
+    w, h = 364.19, 273.14  # beamer 4:3 size, in points
+    beamer = [(w, h, str(n // 3 + 1), lambda c, pw, ph, n = n: _draw_slide(c, pw, ph, n // 3 + 1, n % 3))
+              for n in range(60)]
+
+    slides = [(w, h, None, lambda c, pw, ph, n = n: _draw_slide(c, pw, ph, n + 1)) for n in range(20)]
+    notes = [(595.28, 841.89, None, lambda c, pw, ph, n = n: _draw_slide(c, pw, ph / 3, n + 1, 8))
+             for n in range(20)]
+
+    def draw_right(context, pw, ph, n):
+        _draw_slide(context, pw / 2, ph, n)
+        context.translate(pw / 2, 0)
+        _draw_slide(context, pw / 2, ph, n, 5)
+
+    right = [(2 * w, h, None, lambda c, pw, ph, n = n: draw_right(c, pw, ph, n + 1)) for n in range(20)]
+    images = [(w, h, None, lambda c, pw, ph, n = n: _draw_image(c, pw, ph, n)) for n in range(20)]
+    long_doc = [(w, h, 'A-{}'.format(n + 1), lambda c, pw, ph, n = n: _draw_slide(c, pw, ph, n + 1))
+                for n in range(1000)]
+
+    return {
+        'beamer-overlays': _pdf(directory, 'beamer-overlays', beamer),
+        'notes-after': _pdf(directory, 'notes-after', slides + notes),
+        'notes-right': _pdf(directory, 'notes-right', right),
+        'image-heavy': _pdf(directory, 'image-heavy', images),
+        '1000-pages': _pdf(directory, '1000-pages', long_doc),
+    }
+
+
+def parse_size(text):
+    """ Parse a size given on the command line.
+
+    Args:
+        text (`str`): the size, as WIDTHxHEIGHT
+
+    Returns:
+        `tuple`: the width and height, as `int`
+    """
+    try:
+        width, height = (int(n) for n in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected WIDTHxHEIGHT, got {}'.format(text))
+    return width, height
+
+
+def main(argv = sys.argv[1:]):
+    """ Run the benchmarks and write the results as JSON.
+
+    Args:
+        argv (`list` of `str`): the command line arguments
+    """
+    gettext.install('pympress', util.get_locale_dir())
+    logging.basicConfig(level = logging.WARNING)
+
+    parser = argparse.ArgumentParser(prog = 'python -m pympress.benchmark',
+                                     description = 'Headless rendering benchmarks of pympress')
+    parser.add_argument('files', nargs = '*', help = 'PDF files to benchmark, in addition to the synthetic decks')
+    parser.add_argument('-o', '--output', help = 'file to which to write the JSON results, default stdout')
+    parser.add_argument('--no-synthetic', dest = 'synthetic', action = 'store_false',
+                        help = 'only benchmark the given files')
+    parser.add_argument('--size', type = parse_size, default = (1280, 720), help = 'rendering size, as WIDTHxHEIGHT')
+    parser.add_argument('--pages', type = int, default = 50, help = 'number of pages to render per mode')
+    parser.add_argument('--steps', type = int, default = 100, help = 'number of page changes when navigating')
+    parser.add_argument('--dwell', type = float, default = .1, help = 'seconds spent on each page when navigating')
+    parser.add_argument('--cache-memory', type = int, default = 1024, help = 'cache size in MiB')
+    parser.add_argument('--processes', type = int, default = 0, help = 'number of rendering worker processes')
+    args = parser.parse_args(argv)
+
+    decks = {os.path.basename(path): pathlib.Path(path).resolve().as_uri() for path in args.files}
+    tmp_dir = tempfile.mkdtemp(prefix = 'pympress-benchmark-')
+    try:
+        if args.synthetic:
+            decks.update(synthetic_decks(tmp_dir))
+
+        results = {
+            'pympress': pympress.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'poppler': Poppler.get_version(),
+            'cairo': cairo.cairo_version_string(),
+            'options': {'size': args.size, 'pages': args.pages, 'steps': args.steps, 'dwell': args.dwell,
+                        'cache_memory': args.cache_memory, 'processes': args.processes},
+            'documents': {name: bench_document(uri, args) for name, uri in decks.items()},
+        }
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors = True)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -221,6 +221,20 @@ class Config(configparser.ConfigParser, object):  # python 2 fix
         if self.has_option('content', 'monitor'):
             self.remove_option('content', 'monitor')
 
+        # The cache is now limited by its memory size instead of a number of pages
+        if self.has_option('cache', 'maxpages'):
+            max_pages = self.get('cache', 'maxpages')
+            self.remove_option('cache', 'maxpages')
+
+            # Keep the new default if the old one was used, otherwise count about 4MiB per page (a 1280x800 surface)
+            if max_pages.strip().isdigit() and int(max_pages) != 200:
+                self.set('cache', 'maxmemory', str(max(64, 4 * int(max_pages))))
+                logger.warning('Replacing obsolete option cache.maxpages = {} with cache.maxmemory = {} (MiB)'
+                               .format(max_pages, self.get('cache', 'maxmemory')))
+            else:
+                logger.warning('Ignoring obsolete option cache.maxpages = {}, the cache size is set by cache.maxmemory'
+                               .format(max_pages))
+
         if self.has_section('scribble'):
             for key, val in self.items('scribble'):
                 self.set('highlight', key, val)
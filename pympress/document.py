@@ -39,13 +39,21 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import re
 import math
+import time
+import array
+import bisect
 import enum
+import collections
+import json
+import hashlib
 import tempfile
 import mimetypes
 import webbrowser
 
 import gi
+import cairo
 gi.require_version('Poppler', '0.18')
 from gi.repository import Poppler
 
@@ -55,6 +63,7 @@ except ImportError:
     from urllib import url2pathname
 
 from pympress.util import fileopen
+from pympress import metrics
 
 
 def get_extension(mime_type):
@@ -190,16 +199,13 @@ class Link(object):
         action (`function`):  action to perform when the link is clicked
     """
 
-    #: `float`, first x coordinate of the link rectangle
-    x1 = None
-    #: `float`, first y coordinate of the link rectangle
-    y1 = None
-    #: `float`, second x coordinate of the link rectangle
-    x2 = None
-    #: `float`, second y coordinate of the link rectangle
-    y2 = None
-    #: `function`, action to be perform to follow this link
-    follow = lambda *args, **kwargs: logger.error(_("no action defined for this link!"))
+    __slots__ = {
+        'x1': '`float`, first x coordinate of the link rectangle',
+        'y1': '`float`, first y coordinate of the link rectangle',
+        'x2': '`float`, second x coordinate of the link rectangle',
+        'y2': '`float`, second y coordinate of the link rectangle',
+        'follow': '`function`, action to be perform to follow this link',
+    }
 
     def __init__(self, x1, y1, x2, y2, action):
         self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
@@ -246,49 +252,67 @@ class Page(object):
         parent (:class:`~pympress.document.Document`):  the parent Document class
     """
 
-    #: Page handled by this class (instance of :class:`~Poppler.Page`)
-    page = None
-    #: `int`, number of the current page (starting from 0)
-    page_nb = -1
-    #: `str` representing the page label
-    page_label = None
-    #: All the links in the page, as a `list` of :class:`~pympress.document.Link` instances
-    links = []
-    #: All the media in the page, as a `list` of tuples of (area, filename)
-    medias = []
-    #: `float`, page width
-    pw = 0.
-    #: `float`, page height
-    ph = 0.
-    #: All text annotations
-    annotations = []
-    #: Instance of :class:`~pympress.document.Document` that contains this page.
-    parent = None
+    __slots__ = {
+        'page': 'Page handled by this class (instance of :class:`~Poppler.Page`)',
+        'page_nb': '`int`, number of the current page (starting from 0)',
+        'page_label': '`str` representing the page label',
+        'links': 'All the links in the page, as a `list` of :class:`~pympress.document.Link` instances, '
+                 'or `None` until they are needed',
+        'link_grid': 'The links overlapping each cell of a grid on the page, as a `list` of `tuple` of links',
+        'medias': 'All the media in the page, as a `list` of tuples of (area, filename or '
+                  ':class:`~pympress.document.EmbeddedFile`, show controls), or `None` until needed',
+        'pw': '`float`, page width',
+        'ph': '`float`, page height',
+        'annotations': 'All text annotations, or `None` until the annotations of the page are read',
+        'active_annots': 'The :class:`~Poppler.AnnotMapping` of annotations that act when clicked, e.g. media',
+        'annot_links': 'The links for :attr:`active_annots`, as a `list` of :class:`~pympress.document.Link`',
+        'parent': 'Instance of :class:`~pympress.document.Document` that contains this page.',
+    }
+
+    #: `int` number of rows and columns in :attr:`link_grid`
+    link_grid_size = 16
 
     def __init__(self, page, number, parent):
         self.page = page
         self.page_nb = number
         self.parent = parent
+        self.page_label = None
+        self.pw, self.ph = 0., 0.
         self.links = []
+        self.link_grid = []
         self.medias = []
         self.annotations = []
+        self.active_annots = []
+        self.annot_links = []
 
         if self.page is None:
             return
 
         # Get page label
-        self.page_label = self.page.get_label()
+        self.page_label = self.parent.page_labels[number]
 
         # Read page size
         self.pw, self.ph = self.page.get_size()
 
-        # Read links on the page
-        for link in self.page.get_link_mapping():
-            action = self.get_link_action(link.action.type, link.action)
-            my_link = Link(link.area.x1, link.area.y1, link.area.x2, link.area.y2, action)
-            self.links.append(my_link)
+        # Everything else is read from the page when it is first needed, so that a page change only pays for rendering
+        self.links = self.medias = self.annotations = None
+
+
+    def read_annotations(self):
+        """ Read the annotations of the page: keep the text ones, remove them from the page, and find active ones.
+
+        Text annotations are removed from the page so that they are not rendered, hence this must be done before
+        rendering the page. Annotations that act when clicked are only kept, see :meth:`read_media`.
+
+        Removing annotations changes the page in the Poppler document, so the text annotations are kept in the
+        parent’s :attr:`~pympress.document.Document.page_annotations`, for when this page is built again.
+        """
+        if self.annotations is not None:
+            return
+
+        self.annotations = []
+        self.active_annots = []
 
-        # Read annotations, in particular those that indicate media
         for annotation in self.page.get_annot_mapping():
             content = annotation.annot.get_contents()
             if content:
@@ -298,7 +322,46 @@ class Page(object):
             if annot_type == Poppler.AnnotType.LINK:
                 # just an Annot, not subclassed -- probably redundant with links
                 continue
-            elif annot_type == Poppler.AnnotType.MOVIE:
+            elif annot_type in {Poppler.AnnotType.MOVIE, Poppler.AnnotType.SCREEN, Poppler.AnnotType.FILE_ATTACHMENT}:
+                self.active_annots.append(annotation)
+            elif annot_type in {Poppler.AnnotType.TEXT, Poppler.AnnotType.POPUP,
+                                Poppler.AnnotType.FREE_TEXT}:
+                # text-only annotations, hide them from screen
+                self.page.remove_annot(annotation.annot)
+            elif annot_type in {Poppler.AnnotType.STRIKE_OUT, Poppler.AnnotType.HIGHLIGHT,
+                                Poppler.AnnotType.UNDERLINE, Poppler.AnnotType.SQUIGGLY,
+                                Poppler.AnnotType.POLYGON, Poppler.AnnotType.POLY_LINE,
+                                Poppler.AnnotType.SQUARE, Poppler.AnnotType.CIRCLE,
+                                Poppler.AnnotType.CARET, Poppler.AnnotType.LINE,
+                                Poppler.AnnotType.STAMP, Poppler.AnnotType.INK}:
+                # Poppler already renders annotation of these types, nothing more can be done
+                # even though the rendering isn't always perfect.
+                continue
+            else:
+                logger.warning(_("Pympress can not interpret annotation of type:") + " {} ".format(annot_type))
+
+        known = self.parent.page_annotations.get(self.page_nb)
+        if known is None:
+            self.parent.page_annotations[self.page_nb] = self.annotations
+        else:
+            self.annotations = known
+
+
+    def read_media(self):
+        """ Read the media of the page, and build the links of the annotations that act when clicked.
+
+        Media and files embedded in the document are not extracted here, but only when played or opened.
+        """
+        if self.medias is not None:
+            return
+
+        self.read_annotations()
+        self.medias = []
+        self.annot_links = []
+
+        for annotation in self.active_annots:
+            annot_type = annotation.annot.get_annot_type()
+            if annot_type == Poppler.AnnotType.MOVIE:
                 movie = annotation.annot.get_movie()
                 filepath = self.parent.get_full_path(movie.get_filename())
                 if filepath:
@@ -321,37 +384,78 @@ class Page(object):
                 action = self.get_annot_action(action_obj.any.type, action_obj, annotation.area)
                 if not action:
                     continue
-            elif annot_type == Poppler.AnnotType.FILE_ATTACHMENT:
-                attachment = annotation.annot.get_attachment()
-                prefix, ext = os.path.splitext(attachment.name)
-                with tempfile.NamedTemporaryFile('wb', suffix=ext, prefix=prefix, delete=False) as f:
-                    # now the file name is shotgunned
-                    filename = f.name
-                    self.parent.remove_on_exit(filename)
-                if not attachment.save(filename):
-                    logger.error(_("Pympress can not extract attached file"))
-                    continue
-                action = Link.build_closure(fileopen, filename)
-            elif annot_type in {Poppler.AnnotType.TEXT, Poppler.AnnotType.POPUP,
-                                Poppler.AnnotType.FREE_TEXT}:
-                # text-only annotations, hide them from screen
-                self.page.remove_annot(annotation.annot)
-                continue
-            elif annot_type in {Poppler.AnnotType.STRIKE_OUT, Poppler.AnnotType.HIGHLIGHT,
-                                Poppler.AnnotType.UNDERLINE, Poppler.AnnotType.SQUIGGLY,
-                                Poppler.AnnotType.POLYGON, Poppler.AnnotType.POLY_LINE,
-                                Poppler.AnnotType.SQUARE, Poppler.AnnotType.CIRCLE,
-                                Poppler.AnnotType.CARET, Poppler.AnnotType.LINE,
-                                Poppler.AnnotType.STAMP, Poppler.AnnotType.INK}:
-                # Poppler already renders annotation of these types, nothing more can be done
-                # even though the rendering isn't always perfect.
-                continue
             else:
-                logger.warning(_("Pympress can not interpret annotation of type:") + " {} ".format(annot_type))
-                continue
+                action = Link.build_closure(self.open_attachment, annotation.annot.get_attachment(), annotation.area)
 
             my_annotation = Link(annotation.area.x1, annotation.area.y1, annotation.area.x2, annotation.area.y2, action)
-            self.links.append(my_annotation)
+            self.annot_links.append(my_annotation)
+
+
+    def read_links(self):
+        """ Read the links of the page, and index them with the links of annotations in :attr:`link_grid`.
+        """
+        if self.links is not None:
+            return
+
+        self.read_media()
+        self.links = []
+
+        for link in self.page.get_link_mapping():
+            action = self.get_link_action(link.action.type, link.action)
+            my_link = Link(link.area.x1, link.area.y1, link.area.x2, link.area.y2, action)
+            self.links.append(my_link)
+
+        self.links.extend(self.annot_links)
+        self.build_link_grid()
+
+
+    def open_attachment(self, attachment, rect):
+        """ Open a file attached to the page, extracting it to a temporary file the first time.
+
+        Args:
+            attachment (:class:`~Poppler.Attachment`): The attached file
+            rect (:class:`~Poppler.Rectangle`): The region of the page where the file is attached
+        """
+        prefix, ext = os.path.splitext(attachment.name)
+        filename = self.parent.extract_file(self.extraction_key(rect), attachment.save, ext, prefix)
+        if not filename:
+            logger.error(_("Pympress can not extract attached file"))
+            return
+
+        fileopen(filename)
+
+
+    def build_link_grid(self):
+        """ Index the links of the page in :attr:`link_grid`, so that finding the link at a position is fast.
+
+        Each cell lists the links whose rectangle overlaps it, in the same order as in :attr:`links`.
+        """
+        cells = [[] for _ in range(self.link_grid_size ** 2)]
+
+        for link in self.links:
+            col_from, row_from = self._grid_coordinates(min(link.x1, link.x2), min(link.y1, link.y2))
+            col_to, row_to = self._grid_coordinates(max(link.x1, link.x2), max(link.y1, link.y2))
+            for row in range(row_from, row_to + 1):
+                for col in range(col_from, col_to + 1):
+                    cells[row * self.link_grid_size + col].append(link)
+
+        self.link_grid = [tuple(cell) for cell in cells]
+
+
+    def _grid_coordinates(self, xx, yy):
+        """ Find the column and row of :attr:`link_grid` containing a position on the page.
+
+        Args:
+            xx (`float`):  horizontal coordinate, in PDF units
+            yy (`float`):  vertical coordinate, in PDF units
+
+        Returns:
+            `tuple` of `int`: the column and row, clamped to the grid
+        """
+        last = self.link_grid_size - 1
+        col = int(xx * self.link_grid_size / self.pw) if self.pw else 0
+        row = int(yy * self.link_grid_size / self.ph) if self.ph else 0
+        return min(max(col, 0), last), min(max(row, 0), last)
 
 
     def get_link_action(self, link_type, action):
@@ -373,9 +477,9 @@ class Page(object):
         elif link_type == Poppler.ActionType.GOTO_DEST:
             dest_type = action.goto_dest.dest.type
             if dest_type == Poppler.DestType.NAMED:
-                dest = self.parent.doc.find_dest(action.goto_dest.dest.named_dest)
-                if dest:
-                    return Link.build_closure(self.parent.goto_page, dest.page_num - 1)
+                dest = self.parent.find_dest(action.goto_dest.dest.named_dest)
+                if dest is not None:
+                    return Link.build_closure(self.parent.goto_page, dest - 1)
                 else:
                     warning = _('Unrecognized named destination: ') + str(action.goto_dest.dest.named_dest)
             elif dest_type != Poppler.DestType.UNKNOWN:
@@ -383,10 +487,10 @@ class Page(object):
 
         elif link_type == Poppler.ActionType.NAMED:
             dest_name = action.named.named_dest
-            dest = self.parent.doc.find_dest(dest_name)
+            dest = self.parent.find_dest(dest_name)
 
-            if dest:
-                return Link.build_closure(self.parent.goto_page, dest.page_num)
+            if dest is not None:
+                return Link.build_closure(self.parent.goto_page, dest)
             elif dest_name == "GoBack":
                 return self.parent.goto_prev_hist
             elif dest_name == "GoForward":
@@ -403,9 +507,7 @@ class Page(object):
                 # Same as the 'G' action which allows one to pick a page to jump to
                 return Link.build_closure(self.parent.start_editing_page_number, )
             elif dest_name == "Find":
-                # TODO popup a text box and search results with Page.find_text
-                # http://lazka.github.io/pgi-docs/Poppler-0.18/classes/Page.html#Poppler.Page.find_text
-                warning = _("Pympress does not yet support link type \"{}\" to \"{}\"").format(link_type, dest_name)
+                return Link.build_closure(self.parent.start_search, )
             else:
                 # TODO find out other possible named actions?
                 warning = _("Pympress does not recognize link type \"{}\" to \"{}\"").format(link_type, dest_name)
@@ -459,14 +561,9 @@ class Page(object):
         if link_type == Poppler.ActionType.RENDITION:
             media = action.rendition.media
             if media.is_embedded():
-                ext = get_extension(media.get_mime_type())
-                with tempfile.NamedTemporaryFile('wb', suffix=ext, prefix='pdf_embed_', delete=False) as f:
-                    # now the file name is shotgunned
-                    filename = f.name
-                    self.parent.remove_on_exit(filename)
-                if not media.save(filename):
-                    logger.error(_("Pympress can not extract embedded media"))
-                    return None
+                # Extracted only when the media is first played
+                ext = get_extension(media.get_mime_type()) or ''
+                filename = EmbeddedFile(self.parent, self.extraction_key(rect), media.save, ext, 'pdf_embed_')
             else:
                 filename = self.parent.get_full_path(media.get_filename())
                 if not filename:
@@ -488,6 +585,18 @@ class Page(object):
             return self.get_link_action(link_type, action)
 
 
+    def extraction_key(self, rect):
+        """ Identify a file embedded in this page, so that it is only extracted once even if the page is rebuilt.
+
+        Args:
+            rect (:class:`~Poppler.Rectangle`): The region of the page where the file is embedded
+
+        Returns:
+            `tuple`: a hashable identifier for the embedded file
+        """
+        return (self.page_nb, rect.x1, rect.y1, rect.x2, rect.y2)
+
+
     def number(self):
         """ Get the page number.
         """
@@ -514,12 +623,17 @@ class Page(object):
             :class:`~pympress.document.Link`: the link at the given coordinates
             if one exists, `None` otherwise
         """
+        self.read_links()
+        if not self.link_grid:
+            return None
+
         x, y = dtype.from_screen(x, y)
 
         xx = self.pw * x
         yy = self.ph * (1. - y)
 
-        for link in self.links:
+        col, row = self._grid_coordinates(xx, yy)
+        for link in self.link_grid[row * self.link_grid_size + col]:
             if link.is_over(xx, yy):
                 return link
 
@@ -557,6 +671,7 @@ class Page(object):
         Returns:
             `list` of `str`: annotations on this page
         """
+        self.read_annotations()
         return self.annotations
 
 
@@ -566,9 +681,11 @@ class Page(object):
         Returns:
             `list`: medias in this page
         """
+        self.read_media()
         return self.medias
 
 
+    @metrics.timed('page.render_cairo')
     def render_cairo(self, cr, ww, wh, dtype=PdfPage.FULL):
         """ Render the page on a Cairo surface.
 
@@ -578,6 +695,7 @@ class Page(object):
             wh (`int`):  target height in pixels
             dtype (:class:`~pympress.document.PdfPage`):  the type of document that should be rendered
         """
+        self.read_annotations()
         pw, ph = self.get_size(dtype)
 
         cr.set_source_rgb(1, 1, 1)
@@ -611,6 +729,576 @@ class Page(object):
 
 
 
+class PageLabels(object):
+    """ The labels of the pages of a document, fetched from Poppler only when they are needed.
+
+    Labels are stored compactly: only those that differ from the page number are kept, along with a
+    :class:`~bytearray` of which labels have been fetched already. Use :meth:`fill` to fetch them in the background.
+
+    Searching labels, by prefix or for the pages that share a label, uses an index built once all labels are known:
+    the runs of consecutive pages with the same label, and the distinct labels sorted in lower case.
+
+    Args:
+        pop_doc (:class:`~Poppler.Document`):  the document from which to get the labels, or `None`
+        nb_pages (`int`):  the number of pages in the document
+    """
+    #: The :class:`~Poppler.Document` from which we get labels
+    doc = None
+    #: `bytearray` with a non-zero value for each page whose label is known
+    fetched = bytearray()
+    #: `dict` mapping page numbers to their label, for labels that are not the (1-based) page number
+    custom = {}
+    #: `int` number of the first page whose label may not be known yet
+    next_fetch = 0
+
+    #: `list` of the first page of each run of consecutive pages with the same label, or `None` until it is built
+    run_starts = None
+    #: `dict` mapping each label to the `list` of the runs of pages with that label, as (first, last) tuples
+    label_runs = {}
+    #: `list` of the distinct labels in lower case, in alphabetical order, to find labels by prefix
+    sorted_keys = []
+    #: `list` of the distinct labels, in the same order as :attr:`sorted_keys`
+    sorted_labels = []
+
+    def __init__(self, pop_doc, nb_pages):
+        self.doc = pop_doc
+        self.fetched = bytearray(nb_pages)
+        self.custom = {}
+        self.next_fetch = 0
+        self.run_starts = None
+        self.label_runs = {}
+        self.sorted_keys = []
+        self.sorted_labels = []
+
+
+    def __len__(self):
+        return len(self.fetched)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[n] for n in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('page label index out of range')
+
+        if not self.fetched[index]:
+            label = self.doc.get_page(index).get_label()
+            if label != str(index + 1):
+                self.custom[index] = label
+            self.fetched[index] = 1
+
+        return self.custom.get(index, str(index + 1))
+
+
+    def __iter__(self):
+        return (self[n] for n in range(len(self)))
+
+
+    def is_complete(self):
+        """ Return whether all labels have been fetched.
+
+        Returns:
+            `bool`: `True` iff no more calls to Poppler are needed to get any label
+        """
+        return self.next_fetch >= len(self)
+
+
+    def is_indexed(self):
+        """ Return whether the index of labels is built, i.e. whether looking up labels by run or prefix is cheap.
+
+        Returns:
+            `bool`: `True` iff :meth:`build_index` does not need to fetch any label
+        """
+        return self.run_starts is not None
+
+
+    def fill(self, count = 100):
+        """ Fetch the next labels that are not known yet, then index them. Can be scheduled repeatedly at idle time.
+
+        Args:
+            count (`int`):  the maximum number of labels to fetch
+
+        Returns:
+            `bool`: `True` iff there are labels left to fetch
+        """
+        end = min(len(self), self.next_fetch + count)
+        for n in range(self.next_fetch, end):
+            self[n]
+        self.next_fetch = end
+
+        if self.is_complete():
+            self.build_index()
+            return False
+        return True
+
+
+    def build_index(self):
+        """ Fetch all the labels, and index the runs of pages with the same label and the distinct labels.
+
+        Does nothing if the index is already built.
+        """
+        if self.run_starts is not None:
+            return
+
+        self.run_starts = []
+        self.label_runs = {}
+        previous = None
+        for number, label in enumerate(self):
+            if number and label == previous:
+                runs = self.label_runs[label]
+                runs[-1] = (runs[-1][0], number)
+            else:
+                self.run_starts.append(number)
+                self.label_runs.setdefault(label, []).append((number, number))
+            previous = label
+        self.next_fetch = len(self)
+
+        order = sorted((label.lower(), runs[0][0], label) for label, runs in self.label_runs.items())
+        self.sorted_keys = [key for key, first, label in order]
+        self.sorted_labels = [label for key, first, label in order]
+
+
+    def run(self, number):
+        """ Find the run of consecutive pages that have the same label as a given page.
+
+        Args:
+            number (`int`):  a page number
+
+        Returns:
+            `tuple` of `int`: the first and last pages with the same label as the given page
+        """
+        self.build_index()
+        pos = bisect.bisect_right(self.run_starts, number) - 1
+        end = self.run_starts[pos + 1] - 1 if pos + 1 < len(self.run_starts) else len(self) - 1
+        return self.run_starts[pos], end
+
+
+    def first_page(self, label):
+        """ Find the first page with a label.
+
+        Args:
+            label (`str`):  the label, which must be the label of some page
+
+        Returns:
+            `int`: the first page with the given label
+        """
+        self.build_index()
+        return self.label_runs[label][0][0]
+
+
+    def last_page(self, label):
+        """ Find the last page with a label.
+
+        Args:
+            label (`str`):  the label, which must be the label of some page
+
+        Returns:
+            `int`: the last page with the given label
+        """
+        self.build_index()
+        return self.label_runs[label][-1][1]
+
+
+    def page_after(self, label, number):
+        """ Find the first page with a label after a given page.
+
+        Args:
+            label (`str`):  the label
+            number (`int`):  the page after which to search
+
+        Returns:
+            `int`: the first page after `number` with the given label, or `None` if there are none
+        """
+        self.build_index()
+        runs = self.label_runs.get(label, [])
+        pos = bisect.bisect_right(runs, (number, len(self)))
+        if pos and runs[pos - 1][1] > number:
+            return number + 1
+        elif pos < len(runs):
+            return runs[pos][0]
+        else:
+            return None
+
+
+    def starting_with(self, prefix):
+        """ Find the distinct labels that start with a prefix, ignoring case.
+
+        Args:
+            prefix (`str`):  the beginning of the labels
+
+        Returns:
+            `list` of `str`: the matching labels, in alphabetical order
+        """
+        self.build_index()
+        prefix = prefix.lower()
+        found = []
+        for pos in range(bisect.bisect_left(self.sorted_keys, prefix), len(self.sorted_keys)):
+            if not self.sorted_keys[pos].startswith(prefix):
+                break
+            found.append(self.sorted_labels[pos])
+
+        return found
+
+
+    def has_custom(self):
+        """ Return whether any page has a label that is not its page number, fetching labels as needed.
+
+        Returns:
+            `bool`: `True` iff some label differs from its page number
+        """
+        if self.custom:
+            return True
+        return any(label != str(n + 1) for n, label in enumerate(self))
+
+
+
+class TextIndex(object):
+    """ An index of the words in the text of the pages of a document, built a few pages at a time.
+
+    Each word, in lower case, is mapped to its occurrences: the page number, the offset of the word in the text of
+    the page, and the rectangle it occupies on the page. The index can be searched while it is being filled,
+    in which case only the pages indexed so far are searched.
+
+    Args:
+        pop_doc (:class:`~Poppler.Document`):  the document whose text is indexed, or `None`
+        nb_pages (`int`):  the number of pages in the document
+    """
+    #: The :class:`~Poppler.Document` whose text is indexed
+    doc = None
+    #: `int` number of pages to index
+    nb_pages = 0
+    #: `list` of the text of each indexed page
+    texts = []
+    #: `dict` mapping lower-case words to a `list` of their occurrences, as tuples of the page number,
+    #: the offset in the page’s text, and a `tuple` of the coordinates of the word’s rectangle or `None`
+    terms = {}
+    #: `list` of the keys of :attr:`terms` in order, to find words by prefix, or `None` if it is outdated
+    sorted_terms = None
+    #: Regular expression that matches words
+    word_re = re.compile(r'\w+')
+
+    def __init__(self, pop_doc, nb_pages):
+        self.doc = pop_doc
+        self.nb_pages = nb_pages if pop_doc is not None else 0
+        self.texts = []
+        self.terms = {}
+        self.sorted_terms = None
+
+
+    def is_complete(self):
+        """ Return whether all the pages have been indexed.
+
+        Returns:
+            `bool`: `True` iff all the pages are in the index
+        """
+        return len(self.texts) >= self.nb_pages
+
+
+    def index_page(self, number):
+        """ Add the words of a page to the index. Pages must be indexed in order.
+
+        Args:
+            number (`int`):  the number of the page, which is the number of pages indexed so far
+        """
+        page = self.doc.get_page(number)
+        text = page.get_text() or ''
+        found, layout = page.get_text_layout()
+        if not found or len(layout) != len(text):
+            # Rectangles are one per character of the text, do not use them if they do not match
+            layout = None
+
+        for match in self.word_re.finditer(text):
+            start, end = match.span()
+            rect = None
+            if layout is not None:
+                rect = (min(r.x1 for r in layout[start:end]), min(r.y1 for r in layout[start:end]),
+                        max(r.x2 for r in layout[start:end]), max(r.y2 for r in layout[start:end]))
+            self.terms.setdefault(match.group().lower(), []).append((number, start, rect))
+
+        self.texts.append(text)
+        self.sorted_terms = None
+
+
+    def fill(self, timeout = .01):
+        """ Index the next pages, for at most about `timeout` seconds. Can be scheduled repeatedly at idle time.
+
+        Args:
+            timeout (`float`):  the number of seconds after which no new page is indexed
+
+        Returns:
+            `bool`: `True` iff there are pages left to index
+        """
+        deadline = time.perf_counter() + timeout
+        while not self.is_complete() and time.perf_counter() < deadline:
+            self.index_page(len(self.texts))
+
+        return not self.is_complete()
+
+
+    def words_starting_with(self, prefix):
+        """ Find the indexed words that start with a prefix.
+
+        Args:
+            prefix (`str`):  the beginning of the words, in lower case
+
+        Returns:
+            generator of `str`: the matching words in alphabetical order
+        """
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.terms)
+
+        for pos in range(bisect.bisect_left(self.sorted_terms, prefix), len(self.sorted_terms)):
+            if not self.sorted_terms[pos].startswith(prefix):
+                break
+            yield self.sorted_terms[pos]
+
+
+    def search(self, query):
+        """ Find the pages that contain all the words of a query. Each word of the query matches words it starts.
+
+        Args:
+            query (`str`):  the text to search for
+
+        Returns:
+            `dict`: mapping page numbers to the `list` of matches on that page, as tuples of
+            the offset in the page’s text and the rectangle of the matching word
+        """
+        words = self.word_re.findall(query.lower())
+        found = None
+
+        for word in words:
+            pages = collections.defaultdict(list)
+            for term in self.words_starting_with(word):
+                for number, offset, rect in self.terms[term]:
+                    if found is None or number in found:
+                        pages[number].append((offset, rect))
+
+            found = pages if found is None else {number: found[number] + matches for number, matches in pages.items()}
+
+        return dict(found or {})
+
+
+    def context(self, number, offset, width = 30):
+        """ Get the text around a match, to show it in search results.
+
+        Args:
+            number (`int`):  the number of the page
+            offset (`int`):  the offset of the matched word in the text of the page
+            width (`int`):  the number of characters to get before and after the word
+
+        Returns:
+            `tuple` of `str`: the text before the word, the word, and the text after the word
+        """
+        text = self.texts[number]
+        end = self.word_re.match(text, offset).end()
+        before, after = text[max(0, offset - width):offset], text[end:end + width]
+
+        # Collapse whitespace, including line breaks, but keep a space between the word and its surroundings
+        return (' '.join(before.split()) + (' ' if before[-1:].isspace() else ''), text[offset:end],
+                (' ' if after[:1].isspace() else '') + ' '.join(after.split()))
+
+
+
+class EmbeddedFile(object):
+    """ A file embedded in a document, which is only extracted when it is first needed, e.g. when its media is played.
+
+    Args:
+        parent (:class:`~pympress.document.Document`): The document in which the file is embedded
+        key (`tuple`): The identifier of the embedded file, see :meth:`~pympress.document.Page.extraction_key`
+        save (`function`): The function saving the embedded file to the path passed as argument
+        suffix (`str`): The suffix, i.e. extension, of the extracted file
+        prefix (`str`): The prefix of the extracted file
+    """
+    __slots__ = ['parent', 'key', 'save', 'suffix', 'prefix']
+
+    def __init__(self, parent, key, save, suffix = '', prefix = 'tmp'):
+        self.parent = parent
+        self.key = key
+        self.save = save
+        self.suffix = suffix
+        self.prefix = prefix
+
+
+    @property
+    def name(self):
+        """ `str`: A name for the file, with the right extension to guess its type, without extracting it
+        """
+        return self.prefix + self.suffix
+
+
+    def extract(self):
+        """ Extract the file, or find it where it was previously extracted.
+
+        Returns:
+            `str`: the path to the extracted file, or `None` if it could not be saved
+        """
+        return self.parent.extract_file(self.key, self.save, self.suffix, self.prefix)
+
+
+
+class MediaStore(object):
+    """ Keep files extracted from documents on disk, named after the hash of their content.
+
+    A file embedded several times, in several documents, or in successive versions of a document, is stored once.
+    The index maps each document’s path to its version, i.e. its size and modification time, and to the files
+    extracted from it, so that files of unchanged documents are found again on reload and in later sessions without
+    reading the document. The least recently used files are removed when the total size exceeds the limit.
+
+    Args:
+        base_dir (`str`): The directory in which to store the extracted files
+        max_size (`int`): The maximum number of bytes to use on disk
+    """
+    #: `str` path to the directory containing the extracted files
+    base_dir = None
+
+    #: `int` maximum number of bytes that the extracted files can use on disk
+    max_size = 0
+
+    #: `dict` mapping the paths of documents to their version and to a `dict` of their files’ keys and names
+    index = {}
+
+    #: Name of the file, in :attr:`base_dir`, that holds the :attr:`index`
+    index_file = 'index.json'
+
+    def __init__(self, base_dir, max_size):
+        self.base_dir = base_dir
+        self.max_size = max_size
+        self.index = {}
+
+        try:
+            with open(os.path.join(self.base_dir, self.index_file)) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+
+    @staticmethod
+    def document_version(path):
+        """ Identify the version of a document file, cheaply.
+
+        Args:
+            path (`str`): The path to the document
+
+        Returns:
+            `str`: the size and modification time of the document, or `None` if it can not be read
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return '{}:{}'.format(stat.st_size, stat.st_mtime_ns)
+
+
+    def lookup(self, path, version, key):
+        """ Find a file previously extracted from a document.
+
+        Args:
+            path (`str`): The path to the document
+            version (`str`): The version of the document, see :meth:`document_version`
+            key (`str`): The identifier of the file in the document
+
+        Returns:
+            `str`: the path to the extracted file, or `None` if it is not in the store
+        """
+        doc_version, files = self.index.get(path, (None, {}))
+        if doc_version != version or key not in files:
+            return None
+
+        filename = os.path.join(self.base_dir, files[key])
+        try:
+            os.utime(filename)
+        except OSError:
+            return None
+        return filename
+
+
+    def extract(self, path, version, key, save, suffix = ''):
+        """ Get a file embedded in a document, extracting it unless it is already in the store.
+
+        Args:
+            path (`str`): The path to the document
+            version (`str`): The version of the document, see :meth:`document_version`
+            key (`str`): The identifier of the file in the document
+            save (`function`): The function saving the embedded file to the path passed as argument
+            suffix (`str`): The suffix, i.e. extension, of the extracted file
+
+        Returns:
+            `str`: the path to the extracted file, or `None` if it could not be saved
+        """
+        filename = self.lookup(path, version, key)
+        if filename is not None:
+            return filename
+
+        os.makedirs(self.base_dir, exist_ok = True)
+        fd, tmp_file = tempfile.mkstemp(suffix = '.tmp', dir = self.base_dir)
+        os.close(fd)
+        try:
+            if not save(tmp_file):
+                return None
+
+            digest = hashlib.sha1()
+            with open(tmp_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+
+            name = digest.hexdigest() + suffix
+            filename = os.path.join(self.base_dir, name)
+            if os.path.exists(filename):
+                os.utime(filename)
+            else:
+                os.replace(tmp_file, filename)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+        doc_version, files = self.index.get(path, (None, {}))
+        self.index[path] = (version, dict(files if doc_version == version else {}, **{key: name}))
+
+        self.trim(keep = name)
+        return filename
+
+
+    def trim(self, keep = None):
+        """ Remove the least recently used files until the store fits in :attr:`max_size`, and save the index.
+
+        Args:
+            keep (`str`): The name of a file that must not be removed, e.g. because it is about to be played
+        """
+        files = []
+        for name in os.listdir(self.base_dir):
+            if name == self.index_file or name.endswith('.tmp'):
+                continue
+            stat = os.stat(os.path.join(self.base_dir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+
+        disk_usage = sum(size for mtime, size, name in files)
+        kept = {name for mtime, size, name in files}
+        for mtime, size, name in sorted(files):
+            if disk_usage <= self.max_size:
+                break
+            if name == keep:
+                continue
+            os.remove(os.path.join(self.base_dir, name))
+            disk_usage -= size
+            kept.discard(name)
+
+        for path, (version, doc_files) in list(self.index.items()):
+            doc_files = {key: name for key, name in doc_files.items() if name in kept}
+            if doc_files:
+                self.index[path] = (version, doc_files)
+            else:
+                del self.index[path]
+
+        tmp_index = os.path.join(self.base_dir, self.index_file + '.tmp')
+        with open(tmp_index, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_index, os.path.join(self.base_dir, self.index_file))
+
+
+
 class Document(object):
     """ This is the main document handling class.
 
@@ -630,25 +1318,54 @@ class Document(object):
     path = None
     #: Number of pages in the document
     nb_pages = -1
-    #: Pages cache (`dict` of :class:`~pympress.document.Page`). This makes
+    #: Pages cache (:class:`~collections.OrderedDict` of :class:`~pympress.document.Page`). This makes
     #: navigation in the document faster by avoiding calls to Poppler when loading
-    #: a page that has already been loaded.
+    #: a page that has already been loaded. Pages are ordered from least to most recently used.
     pages_cache = {}
+    #: `int` maximum number of :class:`~pympress.document.Page` kept in :attr:`pages_cache`
+    max_pages_cached = 200
     #: Files that are temporary and need to be removed
     temp_files = set()
+    #: `dict` of the files to which embedded files were extracted, see :meth:`extract_file`
+    extracted_files = {}
+    #: :class:`~pympress.document.MediaStore` keeping extracted files across sessions, or `None` to use temporary files
+    media_store = None
+    #: `tuple` of the path and version of the document file, to find its files in :attr:`media_store`, or `None`
+    media_source = None
     #: History of pages we have visited
     history = []
     #: Our position in the history
     hist_pos = -1
-    #: `dict` of all the page labels
+    #: :class:`~pympress.document.PageLabels` of all the page labels, fetched lazily
     page_labels = []
+    #: :class:`~pympress.document.TextIndex` of the words in the pages, filled in the background
+    text_index = None
+    #: `array` of the widths and heights of all pages, interleaved, or `None` until it is needed,
+    #: to know page sizes without building :class:`~pympress.document.Page` objects
+    page_sizes = None
     #: `bool` indicating whether the second half of pages are in fact notes pages
     notes_after = False
+    #: `dict` mapping page numbers to a hash of their content, see :meth:`fingerprint`
+    fingerprints = {}
+    #: `dict` mapping page numbers to their annotations, as read the first time by
+    #: :meth:`~pympress.document.Page.read_annotations`, which removes text annotations from the pages
+    page_annotations = {}
+    #: `dict` mapping the names of destinations to the (1-based) number of the page they point to,
+    #: or to `None` if they can not be resolved, see :meth:`find_dest`
+    named_dests = {}
+    #: `dict` of the destinations of the previous version of a reloaded document, to check, or `None`
+    reused_dests = None
+    #: `int` number of the next page whose links are scanned for named destinations, see :meth:`resolve_dests`
+    next_dest_scan = 0
+    #: `int` size in pixels of the longest side of the low-resolution render used in page fingerprints
+    fingerprint_size = 96
 
     #: callback, to be connected to :func:`~pympress.extras.Media.play`
     play_media = lambda *args: None
     #: callback, to be connected to :func:`~pympress.editable_label.PageNumber.start_editing`
     start_editing_page_number = lambda *args: None
+    #: callback, to be connected to :func:`~pympress.extras.Search.show`
+    start_search = lambda *args: None
     #: callback, to be connected to :func:`~pympress.ui.UI.goto_page`
     navigate = lambda *args: None
 
@@ -657,24 +1374,41 @@ class Document(object):
             # Connect callbacks
             self.play_media                = builder.get_callback_handler('medias.play')
             self.start_editing_page_number = builder.get_callback_handler('page_number.start_editing')
+            self.start_search              = builder.get_callback_handler('search.show')
             self.goto_page                 = builder.get_callback_handler('goto_page')
             self.goto_next_hist            = builder.get_callback_handler('doc_hist_next')
             self.goto_prev_hist            = builder.get_callback_handler('doc_hist_prev')
+            self.media_store               = builder.media_store
 
         # Setup PDF file
         self.uri = uri
         self.doc = pop_doc
 
+        self.media_source = None
+        if self.media_store is not None and uri is not None and uri.startswith('file://'):
+            path = url2pathname(uri[len('file://'):])
+            version = MediaStore.document_version(path)
+            if version is not None:
+                self.media_source = (path, version)
+
         # Pages number
         if pop_doc is not None:
             self.nb_pages = self.doc.get_n_pages()
-            self.page_labels = [self.doc.get_page(n).get_label() for n in range(self.nb_pages)]
         else:
             self.nb_pages = 0
-            self.page_labels = []
+
+        self.page_labels = PageLabels(pop_doc, self.nb_pages)
+        self.text_index = TextIndex(pop_doc, self.nb_pages)
+        self.page_sizes = None
 
         # Pages cache
-        self.pages_cache = {}
+        self.pages_cache = collections.OrderedDict()
+        self.extracted_files = {}
+        self.fingerprints = {}
+        self.page_annotations = {}
+        self.named_dests = {}
+        self.reused_dests = None
+        self.next_dest_scan = 0
 
 
     def get_structure(self, index_iter = None):
@@ -704,8 +1438,7 @@ class Document(object):
                 if action.type == Poppler.ActionType.GOTO_DEST:
                     title = action.goto_dest.title
                     if action.goto_dest.dest.type == Poppler.DestType.NAMED:
-                        dest = self.doc.find_dest(action.goto_dest.dest.named_dest)
-                        page = dest.page_num - 1
+                        page = self.find_dest(action.goto_dest.dest.named_dest) - 1
                     elif action.goto_dest.dest.type == Poppler.DestType.UNKNOWN:
                         raise AssertionError('Unknown type of destination')
                     else:
@@ -732,10 +1465,8 @@ class Document(object):
                     lower_bound = max(find)
                     find = find[lower_bound]
 
-                try:
-                    page = min(number for number, label in enumerate(self.page_labels)
-                               if label == self.page_labels[page] and number > lower_bound)
-                except ValueError:  # empty iterator
+                page = self.page_labels.page_after(self.page_labels[page], lower_bound)
+                if page is None:
                     page = lower_bound + 1
 
 
@@ -779,21 +1510,21 @@ class Document(object):
         Returns:
             :class:`~pympress.document.PdfPage`: the notes mode
         """
-        page = self.page(current_page)
-        if page is None or not page.can_render():
+        if current_page >= self.pages_number() or current_page < 0:
             return PdfPage.NONE
 
-        ar = page.get_aspect_ratio()
+        ar = self.get_aspect_ratio(current_page)
 
         # Check whether we have N slides with one aspect ratio then N slides with a different aspect ratio
         # that is the sign if Libreoffice notes pages
         if self.nb_pages and self.nb_pages % 2 == 0:
             half_doc = self.nb_pages // 2
-            ar_slides = self.page(0).get_aspect_ratio()
-            ar_notes = self.page(half_doc).get_aspect_ratio()
+            ratios = [w / h for w, h in zip(self.page_sizes[0::2], self.page_sizes[1::2])]
+            ar_slides = ratios[0]
+            ar_notes = ratios[half_doc]
             if ar_slides != ar_notes and \
-                    all(self.page(p).get_aspect_ratio() == ar_slides for p in range(1, half_doc)) and \
-                    all(self.page(half_doc + p).get_aspect_ratio() == ar_notes for p in range(1, half_doc)):
+                    all(ratios[p] == ar_slides for p in range(1, half_doc)) and \
+                    all(ratios[half_doc + p] == ar_notes for p in range(1, half_doc)):
                 return PdfPage.AFTER
 
         # "Regular" slides will have an aspect ratio of 4/3, 16/9, 16/10... i.e. in the range [1..2]
@@ -818,6 +1549,161 @@ class Document(object):
         return PdfPage.NONE
 
 
+    def page_size(self, number, dtype=PdfPage.FULL):
+        """ Get the size of any page, including notes pages, without building a :class:`~pympress.document.Page`.
+
+        The sizes of all pages are read from Poppler once, into the compact :attr:`page_sizes` table.
+
+        Args:
+            number (`int`):  number of the page, including notes pages
+            dtype (:class:`~pympress.document.PdfPage`):  the type of document to consider
+
+        Returns:
+            `(float, float)`: page size
+        """
+        if self.page_sizes is None:
+            self.page_sizes = array.array('d')
+            for n in range(self.nb_pages):
+                self.page_sizes.extend(self.doc.get_page(n).get_size())
+
+        return dtype.scale().from_screen(self.page_sizes[2 * number], self.page_sizes[2 * number + 1])
+
+
+    def get_aspect_ratio(self, number, dtype=PdfPage.FULL, notes=False):
+        """ Get the aspect ratio of a page, without building a :class:`~pympress.document.Page`.
+
+        Args:
+            number (`int`):  number of the page
+            dtype (:class:`~pympress.document.PdfPage`):  the type of document to consider
+            notes (`bool`):  whether to get the ratio of the notes page of that page, as :meth:`notes_page` does
+
+        Returns:
+            `float`: page aspect ratio, or `None` if the page does not exist
+        """
+        if number >= self.pages_number() or number < 0:
+            return None
+
+        if notes and self.notes_after:
+            number = number + self.pages_number()
+
+        w, h = self.page_size(number, dtype)
+        return w / h
+
+
+    def fingerprint(self, number):
+        """ Get a hash of the content of a page, which allows one to recognize unchanged pages across reloads.
+
+        The hash covers the page size, label, text, and annotations, and a low-resolution render of the page.
+        Text-only annotations, that we remove from pages before rendering them, are not part of the hash,
+        so that it does not depend on whether the :class:`~pympress.document.Page` has been built or not.
+
+        Args:
+            number (`int`):  number of the page, including notes pages
+
+        Returns:
+            `str`: the hexadecimal digest of the page content
+        """
+        if number in self.fingerprints:
+            return self.fingerprints[number]
+
+        page = self.doc.get_page(number)
+        pw, ph = page.get_size()
+
+        digest = hashlib.sha1('{}x{} {}\n'.format(pw, ph, page.get_label()).encode('utf-8'))
+        digest.update((page.get_text() or '').encode('utf-8'))
+
+        for annotation in page.get_annot_mapping():
+            annot_type = annotation.annot.get_annot_type()
+            if annot_type in {Poppler.AnnotType.TEXT, Poppler.AnnotType.POPUP, Poppler.AnnotType.FREE_TEXT}:
+                continue
+            area = annotation.area
+            digest.update('\n{} {} {} {} {} {}'.format(annot_type, area.x1, area.y1, area.x2, area.y2,
+                                                       annotation.annot.get_contents()).encode('utf-8'))
+
+        scale = self.fingerprint_size / max(pw, ph)
+        surface = cairo.ImageSurface(cairo.Format.RGB24, max(1, int(pw * scale)), max(1, int(ph * scale)))
+        context = cairo.Context(surface)
+        context.set_source_rgb(1, 1, 1)
+        context.paint()
+        context.scale(scale, scale)
+        page.render_for_printing_with_options(context, Poppler.PrintFlags.DOCUMENT)
+        del context
+
+        surface.flush()
+        digest.update(surface.get_data())
+
+        self.fingerprints[number] = digest.hexdigest()
+        return self.fingerprints[number]
+
+
+    def find_dest(self, name):
+        """ Find the page to which a named destination points. Each name is only resolved once by Poppler.
+
+        Args:
+            name (`str`):  the name of the destination
+
+        Returns:
+            `int`: the number of the page, starting from 1 as in Poppler, or `None` if the destination is unknown
+        """
+        try:
+            return self.named_dests[name]
+        except KeyError:
+            pass
+
+        dest = self.doc.find_dest(name) if self.doc is not None else None
+        self.named_dests[name] = dest.page_num if dest is not None else None
+        return self.named_dests[name]
+
+
+    def reuse_dests(self, old_doc):
+        """ Take over the named destinations of the previous version of a reloaded document.
+
+        They are checked first by :meth:`resolve_dests`. If none of them changed, the table is reused as is and the
+        links of the pages are not scanned again.
+
+        Args:
+            old_doc (:class:`~pympress.document.Document`):  the previous version of this document
+        """
+        self.reused_dests = dict(old_doc.named_dests)
+
+
+    def resolve_dests(self, timeout = .01):
+        """ Resolve the named destinations of a batch of pages’ links, for about `timeout` seconds at most.
+
+        Meant to be called repeatedly at idle time, so that following links and building the outline only need
+        lookups in :attr:`named_dests`.
+
+        Args:
+            timeout (`float`):  the number of seconds after which no new destination or page is resolved
+
+        Returns:
+            `bool`: `True` iff there are destinations left to resolve
+        """
+        deadline = time.perf_counter() + timeout
+        while self.reused_dests and time.perf_counter() < deadline:
+            name, page = self.reused_dests.popitem()
+            if self.find_dest(name) != page:
+                # Destinations changed, scan all the pages as for a new document
+                self.reused_dests = None
+
+        if self.reused_dests:
+            return True
+        elif self.reused_dests is not None:
+            self.reused_dests = None
+            self.next_dest_scan = self.nb_pages
+
+        while self.next_dest_scan < self.nb_pages and time.perf_counter() < deadline:
+            for link in self.doc.get_page(self.next_dest_scan).get_link_mapping():
+                if link.action.type == Poppler.ActionType.GOTO_DEST and \
+                        link.action.goto_dest.dest.type == Poppler.DestType.NAMED:
+                    self.find_dest(link.action.goto_dest.dest.named_dest)
+                elif link.action.type == Poppler.ActionType.NAMED:
+                    self.find_dest(link.action.named.named_dest)
+            self.next_dest_scan += 1
+
+        return self.next_dest_scan < self.nb_pages
+
+
     def set_notes_after(self, notes_after):
         """ Set whether there are notes pages after normal pages (aka Libreoffice notes mode)
 
@@ -827,6 +1713,7 @@ class Document(object):
         self.notes_after = notes_after
 
 
+    @metrics.timed('document.page')
     def page(self, number):
         """ Get the specified page.
 
@@ -839,9 +1726,7 @@ class Document(object):
         if number >= self.pages_number() or number < 0:
             return None
 
-        if number not in self.pages_cache:
-            self.pages_cache[number] = Page(self.doc.get_page(number), number, self)
-        return self.pages_cache[number]
+        return self._cached_page(number)
 
 
     def notes_page(self, number):
@@ -859,8 +1744,69 @@ class Document(object):
         if self.notes_after:
             number = number + self.pages_number()
 
-        if number not in self.pages_cache:
+        return self._cached_page(number)
+
+
+    def get_thumbnail(self, number):
+        """ Get the thumbnail of a whole page embedded in the document, if there is one, without building its page.
+
+        Args:
+            number (`int`):  number of the page, including notes pages
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the thumbnail, or `None` if the document does not contain one
+        """
+        return self.doc.get_page(number).get_thumbnail()
+
+
+    def render_thumbnail(self, number, cr, ww, wh, dtype=PdfPage.FULL):
+        """ Render a page at low resolution, e.g. for a thumbnail, without building its page.
+
+        Unlike :meth:`~pympress.document.Page.render_cairo`, this leaves the page’s annotations untouched,
+        and only draws the content of the page without any annotations.
+
+        Args:
+            number (`int`):  number of the page, including notes pages
+            cr (:class:`~cairo.Context`):  target surface
+            ww (`int`):  target width in pixels
+            wh (`int`):  target height in pixels
+            dtype (:class:`~pympress.document.PdfPage`):  the type of document that should be rendered
+        """
+        pw, ph = self.page_size(number, dtype)
+        scale = min(ww / pw, wh / ph)
+
+        cr.save()
+        cr.scale(scale, scale)
+        cr.rectangle(0, 0, pw, ph)
+        cr.clip()
+        cr.set_source_rgb(1, 1, 1)
+        cr.paint()
+
+        if dtype == PdfPage.RIGHT:
+            cr.translate(-pw, 0)
+        elif dtype == PdfPage.BOTTOM:
+            cr.translate(0, -ph)
+
+        self.doc.get_page(number).render_for_printing_with_options(cr, Poppler.PrintFlags.DOCUMENT)
+        cr.restore()
+
+
+    def _cached_page(self, number):
+        """ Get a page from :attr:`pages_cache`, building it and evicting the least recently used pages if needed.
+
+        Args:
+            number (`int`):  number of the page to return, including notes pages
+
+        Returns:
+            :class:`~pympress.document.Page`: the wanted page
+        """
+        try:
+            self.pages_cache.move_to_end(number)
+        except KeyError:
             self.pages_cache[number] = Page(self.doc.get_page(number), number, self)
+            while len(self.pages_cache) > self.max_pages_cached:
+                self.pages_cache.popitem(last = False)
+
         return self.pages_cache[number]
 
 
@@ -879,7 +1825,45 @@ class Document(object):
         Returns:
             `bool`: False iff there are no labels or they are just the page numbers
         """
-        return self.page_labels != [str(n + 1) for n in range(self.nb_pages)]
+        return self.page_labels.has_custom()
+
+
+    def load_labels(self):
+        """ Fetch the labels of a batch of pages. Meant to be called repeatedly at idle time.
+
+        Returns:
+            `bool`: `True` iff there are labels left to fetch
+        """
+        return self.page_labels.fill()
+
+
+    def index_text(self):
+        """ Index the text of a batch of pages. Meant to be called repeatedly at idle time.
+
+        Returns:
+            `bool`: `True` iff there are pages left to index
+        """
+        return self.text_index.fill()
+
+
+    def search(self, query):
+        """ Find the slides whose text, or the text of their notes pages, contains all the words of a query.
+
+        Only pages already indexed are searched, see :meth:`index_text`.
+
+        Args:
+            query (`str`): the text to search for
+
+        Returns:
+            `list`: of tuples of the slide number, and the `list` of matches as tuples of the page number,
+            the offset of the match in that page’s text, and its rectangle on the page, ordered by slide number
+        """
+        slides = collections.defaultdict(list)
+        for number, matches in self.text_index.search(query).items():
+            slide = number - self.pages_number() if self.notes_after and number >= self.pages_number() else number
+            slides[slide].extend((number, offset, rect) for offset, rect in matches)
+
+        return sorted(slides.items())
 
 
     def lookup_label(self, label, prefix_unique=True):
@@ -895,27 +1879,24 @@ class Document(object):
         # somehow this always returns None:
         # page = self.doc.get_page_by_label(label).get_index()
 
-        # make a shortlist: squash synonymous labels, keeping the last one
-        compatible_labels = {l: n for n, l in enumerate(self.page_labels) if l.lower().startswith(label.lower())}
+        # make a shortlist: synonymous labels are squashed, and we go to the last page of a label
+        compatible_labels = self.page_labels.starting_with(label)
 
         if len(compatible_labels) == 1:
-            return set(compatible_labels.values()).pop()
+            return self.page_labels.last_page(compatible_labels[0])
 
         # try exact match
-        try:
-            return compatible_labels[label]
-        except KeyError:
-            pass
+        if label in self.page_labels.label_runs:
+            return self.page_labels.last_page(label)
 
         # try case-insensitive match, prefix case-sensitive match, prefix case-insensitive match (unless prefix_unique)
+        # and amongst the matches prefer the label that appears first in the document
         full = len(label)
-        for filtering in [lambda l: len(l) == full, lambda l: l.startswith(label), lambda l: not prefix_unique]:
-            try:
-                found = next(label for label in compatible_labels if filtering(label))
-            except StopIteration:
-                pass
-            else:
-                return compatible_labels[found]
+        for filtering in [lambda other: len(other) == full, lambda other: other.startswith(label),
+                          lambda other: not prefix_unique]:
+            matches = [other for other in compatible_labels if filtering(other)]
+            if matches:
+                return self.page_labels.last_page(min(matches, key = self.page_labels.first_page))
 
         return None
 
@@ -947,22 +1928,12 @@ class Document(object):
 
         If we're within a set of pages with the same label we want to go to the last one.
         """
-        labels_after = enumerate(self.page_labels[page + 1:], page + 1)
-
-        try:
-            next_page, next_label = next(labels_after)
-        except StopIteration:
+        if page + 1 >= len(self.page_labels):
             # we're already at the last page!
             return page
 
-        # will stop as soon as next_page + 1 (aka following_page) is a different label or due to end of iterator
-        for following_page, following_label in labels_after:
-            if following_label == next_label:
-                next_page = following_page
-            else:
-                break
-
-        return next_page
+        # the last page of the run of pages that have the label of the next page
+        return self.page_labels.run(page + 1)[1]
 
 
     def label_before(self, page):
@@ -970,12 +1941,8 @@ class Document(object):
 
         If we're within a set of pages with the same label we want to go *before* the first one.
         """
-        # will stop as soon as we find a different label or due to end of iterator
-        for prev_page, prev_label in enumerate(reversed(self.page_labels[:page])):
-            if prev_label != self.page_labels[page]:
-                return page - 1 - prev_page
-
-        return 0
+        # the page before the run of pages that have the current label, or the first page
+        return max(0, self.page_labels.run(page)[0] - 1)
 
 
     def hist_next(self, *args):
@@ -1026,6 +1993,46 @@ class Document(object):
                 return filepath
 
 
+    def extract_file(self, key, save, suffix = '', prefix = 'tmp'):
+        """ Save a file embedded in the document to disk, once per embedded file.
+
+        Files go to the :attr:`media_store` if there is one, where they are found again when the document is reloaded
+        or opened in a later session, otherwise to temporary files that are removed on exit.
+
+        Args:
+            key (`tuple`): The identifier of the embedded file, see :meth:`~pympress.document.Page.extraction_key`
+            save (`function`): The function saving the embedded file to the path passed as argument
+            suffix (`str`): The suffix, i.e. extension, of the extracted file
+            prefix (`str`): The prefix of the temporary file
+
+        Returns:
+            `str`: the path to the extracted file, or `None` if it could not be saved
+        """
+        if key in self.extracted_files and os.path.exists(self.extracted_files[key]):
+            return self.extracted_files[key]
+
+        if self.media_source is not None:
+            path, version = self.media_source
+            try:
+                filename = self.media_store.extract(path, version, repr(key), save, suffix)
+            except OSError:
+                logger.warning('Can not extract embedded file to {}'.format(self.media_store.base_dir), exc_info = True)
+            else:
+                if filename:
+                    self.extracted_files[key] = filename
+                return filename
+
+        with tempfile.NamedTemporaryFile('wb', suffix=suffix, prefix=prefix, delete=False) as f:
+            # now the file name is shotgunned
+            filename = f.name
+            self.remove_on_exit(filename)
+        if not save(filename):
+            return None
+        self.extracted_files[key] = filename
+
+        return self.extracted_files[key]
+
+
     def remove_on_exit(self, filename):
         """ Remember a temporary file to delete later.
 
@@ -1049,6 +2056,7 @@ class EmptyPage(Page):
     This page is a non-notes page with an aspect ratio of 1.3 and nothing else inside.
     Also, it has no "rendering" capability, and is made harmless by overriding its render function.
     """
+    __slots__ = ()
 
     def __init__(self):
         super(EmptyPage, self).__init__(None, -1, None)
@@ -1110,6 +2118,20 @@ class EmptyDocument(Document):
         return self.pages_cache[number] if number in self.pages_cache else None
 
 
+    def get_aspect_ratio(self, number, dtype=PdfPage.FULL, notes=False):
+        """ Get the aspect ratio of a page.
+
+        Args:
+            number (`int`): page number
+            dtype (:class:`~pympress.document.PdfPage`):  the type of document to consider
+            notes (`bool`):  unused
+
+        Returns:
+            `float`: -1 returns the empty page’s aspect ratio, other pages do not exist and return `None`
+        """
+        return self.pages_cache[number].get_aspect_ratio(dtype) if number in self.pages_cache else None
+
+
 ##
 # Local Variables:
 # mode: python
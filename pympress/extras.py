@@ -42,7 +42,7 @@ try:
 except ImportError:
     from urllib import url2pathname
 
-from pympress import document, builder
+from pympress import document, builder, metrics
 
 
 class TimingReport(builder.Builder):
@@ -133,6 +133,26 @@ class TimingReport(builder.Builder):
         del self.page_time[:]
 
 
+    def set_page_labels(self, page_labels):
+        """ Update the page labels of the document, which are fetched after the document is shown.
+
+        Args:
+            page_labels (`list`): the page labels for each of the pages
+        """
+        if self.document_open:
+            self.page_labels = page_labels
+
+
+    def set_document_structure(self, doc_structure):
+        """ Update the structure of the document, which is read after the document is shown.
+
+        Args:
+            doc_structure (`dict`): the structure of the document
+        """
+        if self.document_open:
+            self.doc_structure = doc_structure
+
+
     def show_report(self, gaction, param=None):
         """ Show the popup with the timing infortmation.
         """
@@ -199,6 +219,216 @@ class TimingReport(builder.Builder):
         self.time_report_dialog.hide()
 
 
+class Search(builder.Builder):
+    """ Window to search the text of the slides and notes, and go to the slides that match.
+
+    The text of the document is indexed in the background at low priority, so that it never delays showing slides,
+    and searches only look up the index, so that results are immediate even on long documents.
+
+    Args:
+        parent (:class:`~pympress.ui.UI`): the main UI, whose presenter window is the parent of the search window
+    """
+    #: The :class:`~Gtk.Window` in which to search
+    search_window = None
+    #: The :class:`~Gtk.SearchEntry` in which the query is typed
+    search_entry = None
+    #: The :class:`~Gtk.TreeView` listing the matching slides
+    search_results = None
+    #: The :class:`~Gtk.ListStore` of the page numbers, labels and matching text of the matching slides
+    search_store = None
+    #: The :class:`~Gtk.Label` showing the number of results and the indexing progress
+    search_status = None
+
+    #: The :class:`~pympress.document.Document` being searched
+    doc = None
+
+    #: callback, to be connected to :meth:`~pympress.ui.UI.goto_page`
+    goto_page = lambda *args: None
+
+    def __init__(self, parent):
+        super(Search, self).__init__()
+        self.load_ui('search')
+        self.search_window.set_transient_for(parent.p_win)
+
+        self.goto_page = parent.get_callback_handler('goto_page')
+
+        self.connect_signals(self)
+        parent.setup_actions({
+            'find': dict(activate=self.show),
+        })
+
+
+    def set_document(self, doc):
+        """ Search a new document, and start indexing its text in the background.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document to search
+        """
+        self.doc = doc
+        self.search_store.clear()
+        if self.search_window.get_visible():
+            self.on_search_changed(self.search_entry)
+
+        if not doc.text_index.is_complete():
+            GLib.idle_add(self.index_text, doc, priority=GLib.PRIORITY_LOW)
+
+
+    def index_text(self, doc):
+        """ Index the text of a batch of pages, scheduled repeatedly at low priority on the main loop.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document being indexed
+
+        Returns:
+            `bool`: whether there are more pages to index in the current document
+        """
+        if doc is not self.doc:
+            return False
+
+        more = doc.index_text()
+        if self.search_window.get_visible():
+            if more:
+                self.update_status()
+            else:
+                self.on_search_changed(self.search_entry)
+
+        return more
+
+
+    def update_status(self):
+        """ Show the number of results, and how much of the document is not searched yet.
+        """
+        index = self.doc.text_index
+        status = _('{} matching slides').format(len(self.search_store)) if self.search_entry.get_text() else ''
+        if not index.is_complete():
+            status += (', ' if status else '') + _('indexing pages, {} of {} done').format(len(index.texts),
+                                                                                           index.nb_pages)
+        self.search_status.set_text(status)
+
+
+    def show(self, *args):
+        """ Show the search window, with the previous query selected so that typing replaces it.
+        """
+        if self.doc is None or not self.doc.pages_number():
+            return
+
+        self.update_status()
+        self.search_window.show_all()
+        self.search_window.present()
+        self.search_entry.grab_focus()
+
+
+    def hide(self):
+        """ Hide the search window.
+        """
+        self.search_window.hide()
+
+
+    def on_search_changed(self, widget):
+        """ Search the document for the text of the entry, and list the matching slides.
+
+        Args:
+            widget (:class:`~Gtk.SearchEntry`): the entry containing the query
+        """
+        self.search_store.clear()
+        query = widget.get_text()
+
+        for slide, matches in self.doc.search(query) if query.strip() else []:
+            number, offset, rect = matches[0]
+            before, word, after = self.doc.text_index.context(number, offset)
+            context = '{}<b>{}</b>{}'.format(*(GLib.markup_escape_text(text) for text in (before, word, after)))
+            if len(matches) > 1:
+                context += ' <i>(+{})</i>'.format(len(matches) - 1)
+
+            self.search_store.append([slide, self.doc.page_labels[slide], context])
+
+        if len(self.search_store):
+            self.search_results.set_cursor(Gtk.TreePath.new_first(), None, False)
+
+        self.update_status()
+
+
+    def go_to_result(self, path):
+        """ Hide the search window and go to a slide from the results.
+
+        Args:
+            path (:class:`~Gtk.TreePath`): the path of the result in :attr:`search_store`
+        """
+        page = self.search_store[path][0]
+        self.hide()
+        self.goto_page(page)
+
+
+    def on_search_activate(self, widget):
+        """ Go to the selected result, or the first one, when Enter is pressed in the entry.
+
+        Args:
+            widget (:class:`~Gtk.SearchEntry`): the entry containing the query
+        """
+        model, it = self.search_results.get_selection().get_selected()
+        if it is not None:
+            self.go_to_result(model.get_path(it))
+
+
+    def on_result_activated(self, widget, path, column):
+        """ Go to the slide of a result that was clicked.
+
+        Args:
+            widget (:class:`~Gtk.TreeView`): the list of results
+            path (:class:`~Gtk.TreePath`): the path of the activated result
+            column (:class:`~Gtk.TreeViewColumn`): the column that was clicked
+        """
+        self.go_to_result(path)
+
+
+    def on_search_stop(self, widget):
+        """ Hide the search window when Escape is pressed in the entry.
+
+        Args:
+            widget (:class:`~Gtk.SearchEntry`): the entry containing the query
+        """
+        self.hide()
+
+
+    def on_key_press(self, widget, event):
+        """ Move through the results with the arrows while typing, and close the window with Escape.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the search window
+            event (:class:`~Gdk.Event`): the key press event
+
+        Returns:
+            `bool`: whether the event was consumed
+        """
+        name = Gdk.keyval_name(event.keyval)
+        if name == 'Escape':
+            self.hide()
+            return True
+
+        elif name in {'Up', 'Down'} and self.search_entry.has_focus() and len(self.search_store):
+            path, column = self.search_results.get_cursor()
+            row = path.get_indices()[0] if path is not None else -1
+            row = min(max(0, row + (1 if name == 'Down' else -1)), len(self.search_store) - 1)
+            self.search_results.set_cursor(Gtk.TreePath.new_from_indices([row]), None, False)
+            return True
+
+        return False
+
+
+    def on_delete(self, widget, event):
+        """ Hide the search window instead of destroying it when it is closed.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the search window
+            event (:class:`~Gdk.Event`): the delete event
+
+        Returns:
+            `bool`: `True`, to keep the window
+        """
+        self.hide()
+        return True
+
+
 class Annotations(object):
     """ Widget displaying a PDF’s text annotations.
     """
@@ -251,6 +481,8 @@ class Media(object):
     """
     #: `dict` of :class:`~pympress.media_overlays.base.VideoOverlay` ready to be added on top of the slides
     _media_overlays = {}
+    #: `dict` of the :class:`~pympress.document.EmbeddedFile` of media overlays, to extract when first played
+    _pending_files = {}
 
     #: :class:`~Gtk.Overlay` for the Content window.
     c_overlay = None
@@ -317,8 +549,10 @@ class Media(object):
         """
         self.remove_media_overlays()
         self._media_overlays.clear()
+        self._pending_files.clear()
 
 
+    @metrics.timed('media.replace_overlays')
     def replace_media_overlays(self, current_page, page_type):
         """ Remove current media overlays, add new ones if page contains media.
 
@@ -335,12 +569,13 @@ class Media(object):
             media_id = hash((relative_margins, filename, show_controls))
 
             if media_id not in self._media_overlays:
-                mime_type, enc = mimetypes.guess_type(filename)
+                embedded = isinstance(filename, document.EmbeddedFile)
+                mime_type, enc = mimetypes.guess_type(filename.name if embedded else filename)
                 factory = self.get_factory(mime_type)
 
                 if not factory:
                     logger.warning('No available overlay for mime type {}, ignoring media {}'
-                                   .format(mime_type, filename))
+                                   .format(mime_type, filename.name if embedded else filename))
                     continue
 
                 action_group = Gio.SimpleActionGroup.new()
@@ -354,16 +589,18 @@ class Media(object):
                 v_da_c = factory(self.c_overlay, show_controls, relative_margins, page_type, action_group)
                 v_da_p = factory(self.p_overlay, True, relative_margins, page_type, action_group)
 
-                v_da_c.set_file(filename)
-                v_da_p.set_file(filename)
-
                 self._media_overlays[media_id] = (v_da_c, v_da_p)
+                if embedded:
+                    self._pending_files[media_id] = filename
+                else:
+                    v_da_c.set_file(filename)
+                    v_da_p.set_file(filename)
 
             self._media_overlays[media_id][0].mute(True)
             self._media_overlays[media_id][1].mute(False)
 
             for w in self._media_overlays[media_id]:
-                if w.autoplay:
+                if w.autoplay and self.load_file(media_id):
                     self.set_time(media_id, param=GLib.Variant.new_double(0))
                     w.show()
 
@@ -396,13 +633,36 @@ class Media(object):
             gaction (:class:`~Gio.Action`): the action triggering the call
             param (:class:`~GLib.Variant`): the parameter as a variant, or None
         """
-        if media_id in self._media_overlays:
+        if media_id in self._media_overlays and self.load_file(media_id):
             c, p = self._media_overlays[media_id]
             p.show()
             c.show()
             GLib.idle_add(lambda: any(p.do_play() for p in self._media_overlays[media_id]))
 
 
+    def load_file(self, media_id):
+        """ Give a media’s file to its players, extracting it from the document if it is embedded and not loaded yet.
+
+        Args:
+            media_id (`int`): A unique identifier of the media to load
+
+        Returns:
+            `bool`: `True` iff the players have a file to play
+        """
+        if media_id not in self._pending_files:
+            return True
+
+        filename = self._pending_files[media_id].extract()
+        if not filename:
+            logger.error(_("Pympress can not extract embedded media"))
+            return False
+
+        del self._pending_files[media_id]
+        for widget in self._media_overlays[media_id]:
+            widget.set_file(filename)
+        return True
+
+
     def hide(self, media_id, gaction=None, param=None):
         """ Stops playing a media and hides the player. Used as a callback.
 
@@ -570,15 +830,12 @@ class Zoom(object):
 
     #: callback, to be connected to :func:`~pympress.ui.UI.redraw_current_slide`
     redraw_current_slide = lambda *args: None
-    #: callback, to be connected to :func:`~pympress.ui.UI.clear_cache`
-    clear_cache = lambda *args: None
 
     def __init__(self, builder):
         super(Zoom, self).__init__()
         builder.load_widgets(self)
 
         self.redraw_current_slide = builder.get_callback_handler('redraw_current_slide')
-        self.clear_cache = builder.get_callback_handler('clear_zoom_cache')
         self.set_action_enabled = builder.get_callback_handler('app.set_action_enabled')
 
         builder.setup_actions({
@@ -613,7 +870,6 @@ class Zoom(object):
         self.set_action_enabled('unzoom', False)
 
         self.redraw_current_slide()
-        self.clear_cache()
 
         return True
 
@@ -716,7 +972,6 @@ class Zoom(object):
             Cursor.set_cursor(self.p_central)
 
             self.zoom_selecting = False
-            self.clear_cache()
             self.redraw_current_slide()
             self.set_action_enabled('unzoom', True)
 
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+#       metrics.py
+#
+#       Copyright 2015 Cimbali <me@cimba.li>
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+:mod:`pympress.metrics` -- instrumentation of the hot paths
+-----------------------------------------------------------
+
+This module keeps counters, gauges and latency histograms of what pympress does while presenting:
+drawing widgets, rendering pages, cache hits and misses, etc. Operations slower than
+:attr:`slow_threshold` are also logged as events, along with the page shown at that time, so that
+lags noticed during a talk can be diagnosed afterwards from the JSON file written by :func:`export`.
+
+Instrumentation is disabled by default, in which case it only costs a check of :attr:`enabled`.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import json
+import functools
+import collections
+
+
+#: `bool` whether metrics are being collected
+enabled = False
+
+#: `float` number of seconds above which an operation is recorded in :attr:`slow_events`
+slow_threshold = .04
+
+#: `tuple` of the upper bounds, in milliseconds, of the buckets of latency histograms
+buckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, float('inf'))
+
+#: `dict` mapping the names of counters to their `int` value
+counters = collections.defaultdict(int)
+
+#: `dict` mapping the names of gauges to a `list` of their last and maximum values
+gauges = {}
+
+#: `dict` mapping the names of histograms to a `list` of their count, total and maximum seconds,
+#: followed by the number of measures in each of the :attr:`buckets`
+histograms = {}
+
+#: :class:`~collections.deque` of the most recent operations slower than :attr:`slow_threshold`, as `dict`
+slow_events = collections.deque(maxlen = 1000)
+
+#: `dict` describing the current state of the presentation, e.g. the current page, attached to slow events
+context = {}
+
+#: `float` time at which metrics started being collected
+start_time = None
+
+
+def enable(value = True):
+    """ Start or stop collecting metrics.
+
+    Args:
+        value (`bool`): whether to collect metrics
+    """
+    global enabled, start_time
+    if value and start_time is None:
+        start_time = time.monotonic()
+    enabled = value
+
+
+def set_context(**kwargs):
+    """ Update the description of the current state of the presentation, attached to slow events.
+
+    Args:
+        kwargs: the values to update, e.g. ``page = 41``
+    """
+    context.update(kwargs)
+
+
+def count(name, value = 1):
+    """ Increment a counter.
+
+    Args:
+        name (`str`): the name of the counter
+        value (`int`): how much to add to the counter
+    """
+    if enabled:
+        counters[name] += value
+
+
+def gauge(name, value):
+    """ Record the current value of a quantity, e.g. a queue depth, and keep track of its maximum.
+
+    Args:
+        name (`str`): the name of the gauge
+        value (`int` or `float`): the current value
+    """
+    if not enabled:
+        return
+
+    try:
+        values = gauges[name]
+    except KeyError:
+        gauges[name] = [value, value]
+    else:
+        values[0] = value
+        values[1] = max(values[1], value)
+
+
+def observe(name, duration):
+    """ Add a measure to a latency histogram, and record it as a slow event if needed.
+
+    Args:
+        name (`str`): the name of the histogram
+        duration (`float`): the measured number of seconds
+    """
+    if not enabled:
+        return
+
+    try:
+        hist = histograms[name]
+    except KeyError:
+        hist = histograms[name] = [0, 0., 0.] + [0] * len(buckets)
+
+    hist[0] += 1
+    hist[1] += duration
+    hist[2] = max(hist[2], duration)
+
+    ms = 1000 * duration
+    for n, bound in enumerate(buckets):
+        if ms <= bound:
+            hist[3 + n] += 1
+            break
+
+    if duration > slow_threshold:
+        slow_events.append(dict(context, name = name, ms = round(ms, 3),
+                                time = round(time.monotonic() - start_time, 3)))
+
+
+def timed(name, detail = None):
+    """ Decorator recording the duration of each call to a function in a histogram.
+
+    Args:
+        name (`str`): the name of the histogram
+        detail (`function`): optionally, a function of the arguments of the call that returns a `str` suffix
+                             for the histogram’s name, e.g. to have a histogram per widget
+
+    Returns:
+        `function`: a decorator
+    """
+    def decorator(fun):
+        @functools.wraps(fun)
+        def timed_fun(*args, **kwargs):
+            if not enabled:
+                return fun(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                observe(name if detail is None else name + '.' + detail(*args, **kwargs),
+                        time.perf_counter() - start)
+
+        return timed_fun
+    return decorator
+
+
+def snapshot():
+    """ Get all the collected metrics.
+
+    Returns:
+        `dict`: the counters, gauges, histograms (with durations in milliseconds), and slow events
+    """
+    return {
+        'duration_s': time.monotonic() - start_time if start_time is not None else 0,
+        'slow_threshold_ms': 1000 * slow_threshold,
+        'counters': dict(counters),
+        'gauges': {name: {'last': last, 'max': peak} for name, (last, peak) in gauges.items()},
+        'histograms': {name: {
+            'count': hist[0],
+            'mean_ms': 1000 * hist[1] / hist[0],
+            'max_ms': 1000 * hist[2],
+            'buckets_ms': {str(bound): n for bound, n in zip(buckets, hist[3:]) if n},
+        } for name, hist in histograms.items()},
+        'slow_events': list(slow_events),
+    }
+
+
+def export(path):
+    """ Write all the collected metrics to a JSON file.
+
+    Args:
+        path (`str`): path of the file to write
+    """
+    try:
+        with open(path, 'w') as f:
+            json.dump(snapshot(), f, indent = 2)
+    except OSError:
+        logger.exception(_('Failed to write metrics to {}').format(path))
+    else:
+        logger.info(_('Metrics written to {}').format(path))
+
+
+def reset():
+    """ Forget all the collected metrics.
+    """
+    counters.clear()
+    gauges.clear()
+    histograms.clear()
+    slow_events.clear()
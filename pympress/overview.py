@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+#
+#       overview.py
+#
+#       Copyright 2015 Cimbali <me@cimba.li>
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+:mod:`pympress.overview` -- grid of all slides
+----------------------------------------------
+
+This module provides an overview of all the slides of the presentation, as a grid of thumbnails in which
+a slide can be picked to go to it.
+
+The grid is virtual: it is drawn in a single :class:`~Gtk.DrawingArea`, and only the cells that are visible are
+drawn. Thumbnails are created for visible cells only, in the background at idle time, from the thumbnails
+embedded in the document or the pages already rendered in the :class:`~pympress.surfacecache.SurfaceCache`
+when possible, and otherwise by rendering the page at low resolution. They are kept in a compact 16-bit format,
+so that opening the overview again is instantaneous.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import collections
+
+import gi
+import cairo
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gdk, GLib
+
+from pympress import builder, document
+
+
+class Overview(builder.Builder):
+    """ A window showing a grid of thumbnails of all slides, to go to any slide.
+
+    Args:
+        parent (:class:`~pympress.ui.UI`): the main UI, whose presenter window is the parent of the overview
+    """
+    #: The :class:`~Gtk.Window` containing the overview
+    overview_window = None
+    #: The :class:`~Gtk.ScrolledWindow` in which the grid scrolls
+    overview_scrolled = None
+    #: The :class:`~Gtk.DrawingArea` on which the grid is drawn
+    overview_da = None
+
+    #: `int` width of the thumbnails, in pixels
+    thumbnail_width = 192
+    #: `int` height of the thumbnails, in pixels, depending on the aspect ratio of the slides
+    thumbnail_height = 144
+    #: `int` space around each thumbnail, in pixels
+    margin = 12
+    #: `int` height of the space for the label below each thumbnail, in pixels
+    label_height = 18
+    #: `int` number of thumbnails per row
+    columns = 1
+    #: `int` horizontal offset of the first column, to center the grid
+    offset = 0
+
+    #: :class:`~collections.OrderedDict` of the thumbnails, mapping page numbers to :class:`~cairo.ImageSurface`,
+    #: from least to most recently drawn
+    thumbnails = {}
+    #: `int` maximum number of thumbnails kept in memory
+    max_thumbnails = 1000
+    #: :class:`~collections.OrderedDict` of the page numbers whose thumbnails are waiting to be created
+    pending = {}
+    #: GLib source id of the idle callback creating thumbnails, or `None`
+    render_source = None
+    #: `range` of the page numbers of the cells that were visible the last time the grid was drawn
+    visible = range(0)
+
+    #: The :class:`~pympress.document.Document` whose slides are shown
+    doc = None
+    #: The :class:`~pympress.document.PdfPage` type of the slides in the thumbnails
+    wtype = document.PdfPage.FULL
+    #: `int` number of the page that is currently shown in the presentation
+    current_page = 0
+    #: `int` number of the selected page, which is highlighted and where the keyboard navigation starts
+    selected = 0
+    #: `bool` whether the grid needs to scroll to make the selected page visible once it is laid out
+    scroll_pending = False
+
+    #: callback, to be connected to :meth:`~pympress.ui.UI.goto_page`
+    goto_page = lambda *args: None
+    #: callback, to be connected to :meth:`~pympress.surfacecache.SurfaceCache.get_placeholder`
+    get_placeholder = lambda *args: None
+
+    def __init__(self, parent):
+        super(Overview, self).__init__()
+        self.load_ui('overview')
+        self.overview_window.set_transient_for(parent.p_win)
+        self.connect_signals(self)
+
+        self.goto_page = parent.get_callback_handler('goto_page')
+        self.get_placeholder = parent.get_callback_handler('cache.get_placeholder')
+        self.thumbnails = collections.OrderedDict()
+        self.pending = collections.OrderedDict()
+
+
+    def show(self, doc, wtype, current_page):
+        """ Show the overview of a document, with the current page selected.
+
+        Thumbnails of a previous document, or of another part of the pages, are discarded.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document whose slides are shown
+            wtype (:class:`~pympress.document.PdfPage`): the part of the pages that contains the slides
+            current_page (`int`): number of the page currently shown
+        """
+        if not doc.pages_number():
+            return
+
+        if doc is not self.doc or wtype != self.wtype:
+            self.doc = doc
+            self.wtype = wtype
+            self.thumbnails.clear()
+            self.pending.clear()
+            self.visible = range(0)
+
+            ratio = doc.get_aspect_ratio(0, wtype)
+            self.thumbnail_height = max(1, int(self.thumbnail_width / ratio + .5))
+
+        self.current_page = current_page
+        self.selected = current_page
+        self.scroll_pending = True
+        self.layout(self.overview_da.get_allocated_width())
+
+        self.overview_window.show_all()
+        self.overview_window.present()
+        self.overview_da.grab_focus()
+
+
+    def hide(self):
+        """ Hide the overview, and stop creating thumbnails.
+        """
+        self.overview_window.hide()
+        self.pending.clear()
+        if self.render_source is not None:
+            GLib.source_remove(self.render_source)
+            self.render_source = None
+
+
+    def cell_size(self):
+        """ Get the size of the cells of the grid.
+
+        Returns:
+            `tuple`: the width and height of a cell, in pixels
+        """
+        return self.thumbnail_width + 2 * self.margin, self.thumbnail_height + 2 * self.margin + self.label_height
+
+
+    def layout(self, width):
+        """ Compute the number of columns that fit in the given width, and the height of the whole grid.
+
+        Args:
+            width (`int`): the width available for the grid
+        """
+        if self.doc is None:
+            return
+
+        cell_w, cell_h = self.cell_size()
+        self.columns = max(1, width // cell_w)
+        self.offset = max(0, (width - self.columns * cell_w) // 2)
+
+        rows = -(-self.doc.pages_number() // self.columns)
+        self.overview_da.set_size_request(-1, rows * cell_h)
+
+
+    def cell_position(self, page_nb):
+        """ Get the position of the cell of a page.
+
+        Args:
+            page_nb (`int`): the number of the page
+
+        Returns:
+            `tuple`: the coordinates of the top left corner of the cell
+        """
+        cell_w, cell_h = self.cell_size()
+        row, col = divmod(page_nb, self.columns)
+        return self.offset + col * cell_w, row * cell_h
+
+
+    def page_at(self, x, y):
+        """ Get the page whose cell is at a given position.
+
+        Args:
+            x (`float`): horizontal coordinate in the grid
+            y (`float`): vertical coordinate in the grid
+
+        Returns:
+            `int`: the number of the page, or `None` if there is no cell at that position
+        """
+        cell_w, cell_h = self.cell_size()
+        col = int((x - self.offset) // cell_w)
+        page_nb = int(y // cell_h) * self.columns + col
+
+        if 0 <= col < self.columns and 0 <= page_nb < self.doc.pages_number():
+            return page_nb
+        return None
+
+
+    def on_size_allocate(self, widget, allocation):
+        """ Lay out the grid again when the width of the window changes.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the drawing area
+            allocation (:class:`~Gdk.Rectangle`): the area allocated to the drawing area
+        """
+        cell_w, cell_h = self.cell_size()
+        if max(1, allocation.width // cell_w) != self.columns:
+            self.layout(allocation.width)
+
+        if self.scroll_pending:
+            self.scroll_pending = False
+            GLib.idle_add(self.scroll_to_selected)
+
+
+    def scroll_to_selected(self):
+        """ Scroll the grid so that the selected page is visible.
+        """
+        cell_w, cell_h = self.cell_size()
+        x, y = self.cell_position(self.selected)
+
+        adjustment = self.overview_scrolled.get_vadjustment()
+        if y < adjustment.get_value():
+            adjustment.set_value(y)
+        elif y + cell_h > adjustment.get_value() + adjustment.get_page_size():
+            adjustment.set_value(y + cell_h - adjustment.get_page_size())
+
+        return GLib.SOURCE_REMOVE
+
+
+    def on_draw(self, widget, cairo_context):
+        """ Draw the visible cells of the grid, and queue the creation of the missing thumbnails.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the drawing area
+            cairo_context (:class:`~cairo.Context`): the Cairo context of the visible part of the grid
+        """
+        if self.doc is None:
+            return
+
+        x1, y1, x2, y2 = cairo_context.clip_extents()
+        cell_w, cell_h = self.cell_size()
+
+        cairo_context.set_source_rgb(.2, .2, .2)
+        cairo_context.paint()
+
+        first = int(y1 // cell_h) * self.columns
+        last = min(self.doc.pages_number(), (int(y2 // cell_h) + 1) * self.columns)
+        self.visible = range(first, last)
+
+        cairo_context.set_font_size(12)
+        for page_nb in self.visible:
+            x, y = self.cell_position(page_nb)
+            tx, ty = x + self.margin, y + self.margin
+
+            if page_nb == self.selected or page_nb == self.current_page:
+                cairo_context.set_source_rgb(*((.3, .5, 1.) if page_nb == self.selected else (.6, .6, .6)))
+                cairo_context.rectangle(tx - 4, ty - 4, self.thumbnail_width + 8, self.thumbnail_height + 8)
+                cairo_context.fill()
+
+            thumbnail = self.thumbnails.get(page_nb)
+            if thumbnail is None:
+                cairo_context.set_source_rgb(.35, .35, .35)
+                cairo_context.rectangle(tx, ty, self.thumbnail_width, self.thumbnail_height)
+                cairo_context.fill()
+                self.pending[page_nb] = True
+            else:
+                self.thumbnails.move_to_end(page_nb)
+                cairo_context.set_source_surface(thumbnail, tx, ty)
+                cairo_context.paint()
+
+            label = self.doc.page_labels[page_nb]
+            extents = cairo_context.text_extents(label)
+            cairo_context.set_source_rgb(1, 1, 1)
+            cairo_context.move_to(x + (cell_w - extents.width) / 2 - extents.x_bearing,
+                                  ty + self.thumbnail_height + self.margin / 2 + self.label_height / 2)
+            cairo_context.show_text(label)
+
+        if self.pending and self.render_source is None:
+            self.render_source = GLib.idle_add(self.create_thumbnail, priority = GLib.PRIORITY_LOW)
+
+
+    def create_thumbnail(self):
+        """ Create the thumbnail of the next pending page that is still visible. Runs at idle time.
+
+        Returns:
+            `bool`: whether there are more thumbnails to create
+        """
+        while self.pending:
+            page_nb, _ = self.pending.popitem(last = False)
+            if page_nb in self.visible and page_nb not in self.thumbnails:
+                break
+        else:
+            self.render_source = None
+            return GLib.SOURCE_REMOVE
+
+        self.thumbnails[page_nb] = self.render_thumbnail(page_nb)
+        while len(self.thumbnails) > self.max_thumbnails:
+            self.thumbnails.popitem(last = False)
+
+        x, y = self.cell_position(page_nb)
+        cell_w, cell_h = self.cell_size()
+        self.overview_da.queue_draw_area(x, y, cell_w, cell_h)
+
+        if self.pending:
+            return GLib.SOURCE_CONTINUE
+
+        self.render_source = None
+        return GLib.SOURCE_REMOVE
+
+
+    def render_thumbnail(self, page_nb):
+        """ Create the thumbnail of a page, from the quickest source available.
+
+        The thumbnail embedded in the document is used if there is one and the whole page is a slide,
+        then the largest rendering of the page in the cache, and otherwise the page is rendered.
+        Pages are only known by their numbers and sizes, no :class:`~pympress.document.Page` is built.
+
+        Args:
+            page_nb (`int`): the number of the page
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the thumbnail, in 16 bits per pixel
+        """
+        thumbnail = cairo.ImageSurface(cairo.Format.RGB16_565, self.thumbnail_width, self.thumbnail_height)
+        context = cairo.Context(thumbnail)
+        context.set_source_rgb(.35, .35, .35)
+        context.paint()
+
+        source, source_type = None, self.wtype
+        if self.wtype.direction() in {None, 'page number'}:
+            source, source_type = self.doc.get_thumbnail(page_nb), document.PdfPage.FULL
+        if source is None:
+            source, source_type = self.get_placeholder(page_nb, self.wtype), self.wtype
+
+        if source is None:
+            self.doc.render_thumbnail(page_nb, context, self.thumbnail_width, self.thumbnail_height, self.wtype)
+            return thumbnail
+
+        pw, ph = self.doc.page_size(page_nb, source_type)
+        sx, sy = source.get_device_scale()
+        source_scale = min(source.get_width() / sx / pw, source.get_height() / sy / ph)
+        scale = min(self.thumbnail_width / pw, self.thumbnail_height / ph)
+
+        context.rectangle(0, 0, pw * scale, ph * scale)
+        context.clip()
+        context.scale(scale / source_scale, scale / source_scale)
+        context.set_source_surface(source, 0, 0)
+        context.get_source().set_filter(cairo.Filter.GOOD)
+        context.paint()
+
+        return thumbnail
+
+
+    def on_click(self, widget, event):
+        """ Go to the page that was clicked.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the drawing area
+            event (:class:`~Gdk.Event`): the button press event
+
+        Returns:
+            `bool`: whether the event was consumed
+        """
+        if event.type != Gdk.EventType.BUTTON_PRESS or event.button != 1:
+            return False
+
+        page_nb = self.page_at(event.x, event.y)
+        if page_nb is not None:
+            self.hide()
+            self.goto_page(page_nb)
+        return True
+
+
+    def on_motion(self, widget, event):
+        """ Select the page under the pointer.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the drawing area
+            event (:class:`~Gdk.Event`): the motion event
+
+        Returns:
+            `bool`: whether the event was consumed
+        """
+        page_nb = self.page_at(event.x, event.y)
+        if page_nb is not None and page_nb != self.selected:
+            self.select(page_nb)
+        return False
+
+
+    def select(self, page_nb):
+        """ Select a page, and redraw the cells that changed.
+
+        Args:
+            page_nb (`int`): the number of the page to select
+        """
+        cell_w, cell_h = self.cell_size()
+        for page in (self.selected, page_nb):
+            x, y = self.cell_position(page)
+            self.overview_da.queue_draw_area(x, y, cell_w, cell_h)
+
+        self.selected = page_nb
+
+
+    def on_key_press(self, widget, event):
+        """ Navigate the grid with the keyboard: arrows to select, Return to go to the selected page, Escape to close.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the overview window
+            event (:class:`~Gdk.Event`): the key press event
+
+        Returns:
+            `bool`: whether the event was consumed
+        """
+        name = Gdk.keyval_name(event.keyval)
+        moves = {
+            'Left': -1, 'Right': 1, 'Up': -self.columns, 'Down': self.columns,
+            'Page_Up': -self.columns * 3, 'Page_Down': self.columns * 3,
+            'Home': -self.selected, 'End': self.doc.pages_number(),
+        }
+
+        if name == 'Escape':
+            self.hide()
+        elif name in {'Return', 'KP_Enter', 'space'}:
+            self.hide()
+            self.goto_page(self.selected)
+        elif name in moves:
+            self.select(min(max(0, self.selected + moves[name]), self.doc.pages_number() - 1))
+            self.scroll_to_selected()
+        else:
+            return False
+
+        return True
+
+
+    def on_delete(self, widget, event):
+        """ Hide the overview instead of destroying it when it is closed.
+
+        Args:
+            widget (:class:`~Gtk.Widget`): the overview window
+            event (:class:`~Gdk.Event`): the delete event
+
+        Returns:
+            `bool`: `True`, to keep the window
+        """
+        self.hide()
+        return True
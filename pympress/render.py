@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+#
+#       render.py
+#
+#       Copyright 2015 Cimbali <me@cimba.li>
+#
+#       This program is free software; you can redistribute it and/or modify
+#       it under the terms of the GNU General Public License as published by
+#       the Free Software Foundation; either version 2 of the License, or
+#       (at your option) any later version.
+#
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU General Public License for more details.
+#
+#       You should have received a copy of the GNU General Public License
+#       along with this program; if not, write to the Free Software
+#       Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+#       MA 02110-1301, USA.
+"""
+:mod:`pympress.render` -- headless page rendering
+-------------------------------------------------
+
+This module rasterizes pages of a :class:`~pympress.document.Document` into plain
+:class:`~cairo.ImageSurface`, without any window or widget. It does not depend on Gtk,
+so it can be used from scripts, benchmarks, and the worker processes of a
+:class:`~pympress.surfacecache.RenderPool`.
+
+The :class:`~pympress.render.PageRenderer` keeps the pages it renders in a cache bounded in memory.
+The :class:`~pympress.surfacecache.SurfaceCache` of the GUI manages its own per-widget caches,
+but does the actual rendering with the functions of this module.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import gettext
+import collections
+import multiprocessing.util
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # python < 3.8
+    shared_memory = None
+
+import cairo
+
+from pympress import document, util
+
+
+def create_surface(width, height, scale = 1, fmt = cairo.Format.RGB24):
+    """ Create an image surface for a page displayed in an area of the given size.
+
+    Args:
+        width (`int`): width of the area in which the page is displayed, in logical pixels
+        height (`int`): height of the area in which the page is displayed, in logical pixels
+        scale (`int`): number of device pixels per logical pixel
+        fmt (:class:`~cairo.Format`): the format of the new surface
+
+    Returns:
+        :class:`~cairo.ImageSurface`: a new image surface of ``width * scale`` by ``height * scale`` pixels
+    """
+    surface = cairo.ImageSurface(fmt, max(1, width * scale), max(1, height * scale))
+    surface.set_device_scale(scale, scale)
+    return surface
+
+
+def surface_bytes(surface):
+    """ Get the memory used by the pixels of a surface.
+
+    Args:
+        surface (:class:`~cairo.ImageSurface`):  the surface to measure
+
+    Returns:
+        `int`: the size in bytes of the surface’s data
+    """
+    return surface.get_stride() * surface.get_height()
+
+
+def render_page(page, surface, ww, wh, wtype = document.PdfPage.FULL):
+    """ Rasterize a page into an existing surface.
+
+    Args:
+        page (:class:`~pympress.document.Page`): the page to render
+        surface (:class:`~cairo.ImageSurface`): the surface into which to render the page
+        ww (`int`): width of the area in which the page is displayed, in logical pixels
+        wh (`int`): height of the area in which the page is displayed, in logical pixels
+        wtype (:class:`~pympress.document.PdfPage`): the type of page to render
+
+    Returns:
+        `float`: the number of seconds spent rendering the page
+    """
+    start = time.monotonic()
+    context = cairo.Context(surface)
+    page.render_cairo(context, ww, wh, wtype)
+    del context
+    surface.flush()
+    return time.monotonic() - start
+
+
+
+class PageRenderer(object):
+    """ Render the pages of a document into image surfaces, and keep the most recently used ones.
+
+    Args:
+        doc (:class:`~pympress.document.Document`): the document to render
+        max_memory (`int`): The maximum number of bytes used by the cached pages, 0 to disable caching
+    """
+    #: The :class:`~pympress.document.Document` whose pages we render
+    doc = None
+
+    #: :class:`~collections.OrderedDict` of the rendered pages, from least to most recently used. Its keys are
+    #: tuples of (page number, size, page type, scale) and its values are :class:`~cairo.ImageSurface`.
+    cache = {}
+
+    #: `int` number of bytes used by the surfaces in :attr:`cache`
+    memory = 0
+
+    #: `int` maximum number of bytes used by the surfaces in :attr:`cache`
+    max_memory = 0
+
+    #: `int` number of pages rendered since the renderer was created
+    rendered = 0
+
+    #: `float` total number of seconds spent rendering pages
+    render_time = 0.
+
+    def __init__(self, doc, max_memory = 1 << 28):
+        self.doc = doc
+        self.max_memory = max_memory
+        self.cache = collections.OrderedDict()
+
+
+    @classmethod
+    def open(cls, uri, max_memory = 1 << 28):
+        """ Open a document and create a renderer for it.
+
+        Args:
+            uri (`str`): URI of the PDF file to open
+            max_memory (`int`): The maximum number of bytes used by the cached pages
+
+        Returns:
+            :class:`~pympress.render.PageRenderer`: a renderer for the opened document
+        """
+        return cls(document.Document.create(None, uri), max_memory)
+
+
+    def swap_document(self, new_doc):
+        """ Render pages from another document, and forget the pages rendered from the previous one.
+
+        Args:
+            new_doc (:class:`~pympress.document.Document`): the new document
+        """
+        self.doc = new_doc
+        self.clear()
+
+
+    def clear(self):
+        """ Remove all pages from the cache.
+        """
+        self.cache.clear()
+        self.memory = 0
+
+
+    def get(self, page_nb, ww, wh, wtype = document.PdfPage.FULL, scale = 1):
+        """ Get a rendered page from the cache.
+
+        Args:
+            page_nb (`int`): number of the page
+            ww (`int`): width of the area in which the page is displayed, in logical pixels
+            wh (`int`): height of the area in which the page is displayed, in logical pixels
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            scale (`int`): number of device pixels per logical pixel
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the cached page, or `None` if it was not rendered yet
+        """
+        key = (page_nb, (ww, wh), wtype, scale)
+        if key not in self.cache:
+            return None
+
+        self.cache.move_to_end(key)
+        return self.cache[key]
+
+
+    def render(self, page, ww, wh, wtype = document.PdfPage.FULL, scale = 1):
+        """ Get a page rendered for an area of the given size, from the cache or by rendering it.
+
+        Args:
+            page (:class:`~pympress.document.Page` or `int`): the page to render, or its number
+            ww (`int`): width of the area in which the page is displayed, in logical pixels
+            wh (`int`): height of the area in which the page is displayed, in logical pixels
+            wtype (:class:`~pympress.document.PdfPage`): the type of page to render
+            scale (`int`): number of device pixels per logical pixel
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the rendered page, or `None` if there is no such page
+        """
+        if not isinstance(page, document.Page):
+            page = self.doc.page(page)
+        if page is None:
+            return None
+
+        surface = self.get(page.number(), ww, wh, wtype, scale)
+        if surface is not None:
+            return surface
+
+        surface = create_surface(ww, wh, scale)
+        self.render_time += render_page(page, surface, ww, wh, wtype)
+        self.rendered += 1
+
+        self.store(page.number(), ww, wh, wtype, scale, surface)
+        return surface
+
+
+    def store(self, page_nb, ww, wh, wtype, scale, surface):
+        """ Add a rendered page to the cache, and evict the least recently used pages if needed.
+
+        Args:
+            page_nb (`int`): number of the page
+            ww (`int`): width of the area in which the page is displayed, in logical pixels
+            wh (`int`): height of the area in which the page is displayed, in logical pixels
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            scale (`int`): number of device pixels per logical pixel
+            surface (:class:`~cairo.ImageSurface`): the rendered page
+        """
+        key = (page_nb, (ww, wh), wtype, scale)
+        if key in self.cache:
+            self.memory -= surface_bytes(self.cache.pop(key))
+
+        self.cache[key] = surface
+        self.memory += surface_bytes(surface)
+
+        while self.cache and self.memory > self.max_memory:
+            key, evicted = self.cache.popitem(False)
+            self.memory -= surface_bytes(evicted)
+
+
+    def average_render_time(self):
+        """ Get the average time spent rendering a page.
+
+        Returns:
+            `float`: the average number of seconds per rendered page, or `None` if no page was rendered
+        """
+        return self.render_time / self.rendered if self.rendered else None
+
+
+#: :class:`~pympress.render.PageRenderer` of the document opened by the current worker process of a
+#: :class:`~pympress.surfacecache.RenderPool`, and the key identifying that document, as a `tuple`
+_worker_renderer = (None, None)
+
+
+def init_worker():
+    """ Initialize a rendering worker process.
+    """
+    gettext.install('pympress', util.get_locale_dir())
+    multiprocessing.util.Finalize(None, _cleanup_worker, exitpriority=0)
+
+
+def _cleanup_worker():
+    """ Remove the files extracted by the document of a rendering worker process.
+    """
+    key, renderer = _worker_renderer
+    if renderer is not None:
+        renderer.doc.cleanup_media_files()
+
+
+def worker_renderer(doc_key):
+    """ Get the renderer of a worker process for a document, opening the document if it is not opened yet.
+
+    Args:
+        doc_key (`tuple`): the URI of the document and a generation counter, identifying the document to render
+
+    Returns:
+        :class:`~pympress.render.PageRenderer`: a renderer for the document, that does not cache pages
+    """
+    global _worker_renderer
+    key, renderer = _worker_renderer
+    if key != doc_key:
+        if renderer is not None:
+            renderer.doc.cleanup_media_files()
+        # Pages are handed to the main process or written to files, there is no point in caching them here
+        renderer = PageRenderer.open(doc_key[0], max_memory = 0)
+        _worker_renderer = (doc_key, renderer)
+
+    return renderer
+
+
+def attach_shared(name):
+    """ Open a shared memory buffer that was created, and will be removed, by the main process.
+
+    Only the main process tracks the buffer, so that it is removed exactly once, even if the worker is terminated.
+
+    Args:
+        name (`str`): the name of the shared memory buffer
+
+    Returns:
+        :class:`~multiprocessing.shared_memory.SharedMemory`: the shared memory buffer
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 tracks every buffer it opens, see https://bugs.python.org/issue39959, which is harmless here:
+        # spawned workers share the resource tracker of the main process, so this registers the buffer a second time
+        # in the same tracker, and the main process unregisters it when removing it.
+        return shared_memory.SharedMemory(name=name)
+
+
+def render_shared(doc_key, page_nb, name, width, height, stride, scale, ww, wh, wtype):
+    """ Render a page in a worker process, into a shared memory buffer created by the main process.
+
+    Args:
+        doc_key (`tuple`): the URI of the document and a generation counter, identifying the document to render
+        page_nb (`int`): number of the page to render
+        name (`str`): the name of the shared memory buffer in which to render the page
+        width (`int`): width of the target surface in pixels
+        height (`int`): height of the target surface in pixels
+        stride (`int`): stride of the RGB24 image in the shared memory buffer
+        scale (`tuple`): the device scale of the target surface
+        ww (`int`): width of the widget in which the page is displayed
+        wh (`int`): height of the widget in which the page is displayed
+        wtype (`int`): the :class:`~pympress.document.PdfPage` type of the rendered page
+    """
+    renderer = worker_renderer(doc_key)
+
+    shm = attach_shared(name)
+    try:
+        surface = cairo.ImageSurface.create_for_data(shm.buf, cairo.Format.RGB24, width, height, stride)
+        surface.set_device_scale(*scale)
+
+        render_page(renderer.doc.page(page_nb), surface, ww, wh, document.PdfPage(wtype))
+
+        surface.finish()
+        del surface
+    finally:
+        shm.close()
@@ -35,7 +35,7 @@ import cairo
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, Gdk, GLib
 
-from pympress import builder, extras, util
+from pympress import builder, extras, metrics, util
 
 
 class Scribbler(builder.Builder):
@@ -345,6 +345,7 @@ class Scribbler(builder.Builder):
         self.next_render = 0
 
 
+    @metrics.timed('scribble.prerender')
     def prerender(self):
         """ Clear scribbles to cached.
         """
@@ -410,6 +411,7 @@ class Scribbler(builder.Builder):
         return path
 
 
+    @metrics.timed('scribble.draw', lambda self, widget, cairo_context: widget.get_name())
     def draw_scribble(self, widget, cairo_context):
         """ Perform the drawings by user.
 
@@ -30,37 +30,92 @@ is done by the :class:`~pympress.surfacecache.SurfaceCache` class, using several
 The problem is, neither Gtk+ nor Poppler are particularly threadsafe.
 Hence the prerendering isn't really done in parallel in another thread, but
 scheduled on the main thread at idle times using GLib.idle_add().
+A page needed by several widgets is rasterized once, at the largest size, and scaled down with cairo for the others.
+
+Pages are rasterized with the functions of :mod:`pympress.render`, which do not depend on Gtk.
+Optionally, a :class:`~pympress.surfacecache.RenderPool` of worker processes can do
+the rendering instead: each worker opens its own copy of the document, and hands back
+rendered pages through shared memory, so that only copying pixels is left to the main thread.
+
+Rendered pages can also be kept on disk across sessions by a :class:`~pympress.surfacecache.DiskCache`.
 """
 
 import logging
 logger = logging.getLogger(__name__)
 
+import os
+import time
+import shutil
 import threading
+import heapq
 import functools
+import itertools
 import collections
+import hashlib
+import zlib
+import multiprocessing
+import multiprocessing.util
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # python < 3.8
+    shared_memory = None
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from urllib.request import url2pathname
+except ImportError:
+    from urllib import url2pathname
 
 import gi
 import cairo
 gi.require_version('Gtk', '3.0')
 from gi.repository import GLib
 
+from pympress import metrics, render, util
+
 
 class SurfaceCache(object):
     """ Pages caching and prerendering made (almost) easy.
 
     Args:
         doc (:class:`~pympress.document.Document`):  the current document
-        max_pages (`int`): The maximum page number.
+        max_memory (`int`): The maximum number of bytes used by all cached pages.
+        render_processes (`int`): The number of worker processes that render pages, 0 to render on the main thread
+        disk_size (`int`): The maximum number of bytes of rendered pages to keep on disk, 0 to disable the disk cache
     """
 
     #: The actual cache. The `dict`s keys are widget names and its values are
-    #: :class:`~collections.OrderedDict`, whose keys are page numbers
-    #: and values are instances of :class:`~cairo.ImageSurface`.
+    #: :class:`~collections.OrderedDict`, whose keys are tuples of (page number, widget size, page type)
+    #: and values are instances of :class:`~cairo.ImageSurface`. Pages rendered at several sizes, e.g. before
+    #: and after switching layouts or toggling fullscreen, thus share the memory of the cache.
     #: In each :class:`~collections.OrderedDict` keys are ordered by
-    #: Least Recently Used (get or set), when the size is beyond
-    #: :attr:`max_pages`, pages are popped from the start of the cache.
+    #: Least Recently Used (get or set), when the memory used by all widgets is beyond
+    #: :attr:`max_memory`, pages are popped from the start of the caches, in :attr:`eviction_order`.
     surface_cache = {}
 
+    #: `dict` of the number of bytes used by the cached surfaces of each widget
+    surface_memory = {}
+
+    #: `dict` of the eviction priority of each widget, lower priorities are evicted first
+    eviction_priority = {}
+
+    #: `set` of the widget names whose pages are stored in and loaded from :attr:`disk_cache`
+    persistent_widgets = set()
+
+    #: `dict` of the surfaces cached before the document was reloaded. Its keys are widget names and its values
+    #: are `dict`s mapping (page fingerprint, widget size, page type) to :class:`~cairo.ImageSurface`.
+    #: Pages of the reloaded document with the same fingerprint reuse these surfaces instead of being rendered.
+    reloaded_surfaces = {}
+
+    #: `int` number of bytes used by the surfaces in :attr:`reloaded_surfaces`
+    reloaded_memory = 0
+
     #: `dict` containing functions that return a :class:`~cairo.Surface` given a :format:`~cairo.Format`,
     #: width `int` and height `int`, see :meth:`~Gtk.Window.create_similar_image_surface`
     surface_factory = {}
@@ -85,16 +140,106 @@ class SurfaceCache(object):
     #: Set of active widgets
     active_widgets = set()
 
-    #: maximum number fo pages we keep in cache
-    max_pages = 200
+    #: maximum number of bytes used by the surfaces we keep in cache
+    max_memory = 1 << 30
 
-    def __init__(self, doc, max_pages):
-        self.max_pages = max_pages
-        self.doc = doc
-        self.doc_lock = threading.Lock()
+    #: `list` of widget names, in the order in which their caches are evicted
+    eviction_order = []
+
+    #: :class:`~pympress.surfacecache.RenderPool` rendering pages out of process, or `None` if it is disabled
+    render_pool = None
+
+    #: :class:`~pympress.surfacecache.DiskCache` keeping rendered pages across sessions, or `None` if it is disabled
+    disk_cache = None
+
+    #: Heap of rendering jobs, as `list` of tuples (rank, urgency, sequence number, widget name, page number, size)
+    render_queue = []
+
+    #: `dict` mapping the (widget name, page number, size) of queued jobs to their entry in :attr:`render_queue`.
+    #: Entries that are in :attr:`render_queue` but not here are cancelled.
+    queued_jobs = {}
+
+    #: GLib source id of the idle callback that runs the jobs from :attr:`render_queue`, or `None`
+    render_source = None
+
+    #: `set` of the numbers of cached pages whose fingerprint is not computed yet
+    fingerprint_queue = set()
+
+    #: GLib source id of the idle callback that computes the fingerprints from :attr:`fingerprint_queue`, or `None`
+    fingerprint_source = None
+
+    #: :func:`~itertools.count` numbering jobs, so that jobs of equal rank run in the order they were queued
+    job_counter = None
+
+    #: `set` of the widget names whose jobs run before those of other widgets for pages of the same rank
+    urgent_widgets = set()
+
+    #: `dict` mapping (widget name, page number) to the `list` of functions to call once the page is rendered
+    render_callbacks = {}
+
+    #: :class:`~collections.deque` of the last pages shown, as tuples of (time, page number)
+    page_visits = None
+
+    #: `int` number of pages to prerender after the current page while the rendering cost is unknown
+    prerender_depth = 4
+
+    #: `int` minimum number of pages to prerender after the current page
+    min_prerender_depth = 2
+
+    #: `int` maximum number of pages to prerender after the current page
+    max_prerender_depth = 16
+
+    #: `float` number of seconds of rendering that the prerendering lookahead aims to fill
+    prerender_budget = .5
+
+    #: `float` average number of seconds spent rendering a page, or `None` if no page was rendered yet
+    render_cost = None
+
+    #: `float` maximum number of seconds between page changes that are part of a burst
+    burst_interval = .4
+
+    #: `dict` mapping the names of widgets being resized to the GLib source that ends their resizing
+    resizing = {}
+
+    #: `int` number of milliseconds without resize events after which a widget is done resizing
+    resize_delay = 200
+
+    #: `list` of the pages last planned for prerendering, see :meth:`prerender_plan`
+    prerender_pages = []
+
+    #: `int` size of the side of the square tiles of zoomed pages, see :meth:`get_tile`
+    tile_size = 256
 
+    #: :class:`~pympress.render.PageRenderer` keeping low resolution renderings of pages, that are not tied
+    #: to any widget, e.g. to draw while the page is not yet rendered at the right size
+    page_renderer = None
 
-    def add_widget(self, widget, wtype, prerender_enabled = True, zoomed = False):
+    def __init__(self, doc, max_memory, render_processes = 0, disk_size = 0):
+        self.max_memory = max_memory
+        self.doc = doc
+        self.doc_lock = threading.Lock()
+        self.render_queue = []
+        self.queued_jobs = {}
+        self.render_callbacks = {}
+        self.fingerprint_queue = set()
+        self.job_counter = itertools.count()
+        self.resizing = {}
+        self.prerender_pages = []
+        self.page_visits = collections.deque(maxlen = 4)
+        self.page_renderer = render.PageRenderer(doc, max_memory // 64)
+
+        if disk_size > 0:
+            self.disk_cache = DiskCache(os.path.join(util.get_cache_path(), 'pages'), disk_size)
+            self.disk_cache.swap_document(doc.get_uri())
+
+        if render_processes > 0 and shared_memory is None:
+            logger.warning(_('Rendering pages in separate processes requires python 3.8 or later'))
+        elif render_processes > 0:
+            self.render_pool = RenderPool(render_processes)
+            self.render_pool.swap_document(doc)
+
+
+    def add_widget(self, widget, wtype, prerender_enabled = True, zoomed = False, priority = 0, urgent = False):
         """ Add a widget to the list of widgets that have to be managed (for caching and prerendering).
 
         This creates new entries for ``widget_name`` in the needed internal data
@@ -105,31 +250,135 @@ class SurfaceCache(object):
             wtype (`int`):  type of document handled by the widget (see :attr:`surface_type`)
             prerender_enabled (`bool`):  whether this widget is initially in the list of widgets to prerender
             zoomed (`bool`): whether we will cache a zoomed portion of the widget
+            priority (`int`): how long to keep the pages of this widget when memory is short, lowest is evicted first
+            urgent (`bool`): whether to render pages for this widget before other widgets
         """
         widget_name = widget.get_name() + ('_zoomed' if zoomed else '')
         with self.locks.setdefault(widget_name, threading.Lock()):
             self.surface_cache[widget_name] = collections.OrderedDict()
+            self.surface_memory[widget_name] = 0
+            self.reloaded_surfaces[widget_name] = {}
+            self.eviction_priority[widget_name] = priority
+            self.eviction_order = sorted(self.eviction_priority, key = self.eviction_priority.get)
             self.surface_size[widget_name] = (-1, -1)
             self.surface_type[widget_name] = wtype
             self.surface_factory[widget_name] = functools.partial(self._create_surface, widget)
             if prerender_enabled and not zoomed:
                 self.enable_prerender(widget_name)
+            if not zoomed:
+                self.persistent_widgets.add(widget_name)
+            if urgent:
+                self.urgent_widgets.add(widget_name)
 
 
-    def swap_document(self, new_doc):
+    def swap_document(self, new_doc, reloading = False):
         """ Replaces the current document for which to cache slides with a new one.
 
         This function also clears the cached pages, since they now belong to an outdated document.
+        When reloading, the pages whose fingerprint is known are set aside in :attr:`reloaded_surfaces`,
+        so that the pages of the new document that did not change are not rendered again.
 
         Args:
             new_doc (:class:`~pympress.document.Document`):  the new document
+            reloading (`bool`):  whether the new document is a new version of the current document
         """
         with self.doc_lock:
+            old_doc = self.doc
             self.doc = new_doc
 
+        self.page_renderer.swap_document(new_doc)
+
+        if self.render_pool is not None:
+            self.render_pool.swap_document(new_doc)
+
+        if self.disk_cache is not None:
+            self.disk_cache.swap_document(new_doc.get_uri())
+
+        self.cancel_prerender(requested = True)
+        self.render_callbacks.clear()
+        self.fingerprint_queue.clear()
+        self.page_visits.clear()
+
+        self.reloaded_memory = 0
         for widget_name in self.locks:
             with self.locks[widget_name]:
-                self.surface_cache[widget_name].clear()
+                reloaded = self.reloaded_surfaces[widget_name]
+                reloaded.clear()
+
+                if reloading and widget_name in self.persistent_widgets:
+                    for (page_nb, size, wtype), surface in self.surface_cache[widget_name].items():
+                        fingerprint = old_doc.fingerprints.get(page_nb)
+                        if fingerprint is not None and (fingerprint, size, wtype) not in reloaded:
+                            reloaded[(fingerprint, size, wtype)] = surface
+                            self.reloaded_memory += render.surface_bytes(surface)
+
+                self._clear(widget_name)
+
+
+    def _queue_fingerprint(self, page_nb):
+        """ Schedule computing the fingerprint of a cached page, while the file still matches the open document.
+
+        The fingerprints are only read when the document is reloaded, at which point the file has already changed.
+
+        Args:
+            page_nb (`int`):  number of the page whose fingerprint is needed
+        """
+        if page_nb in self.doc.fingerprints:
+            return
+
+        self.fingerprint_queue.add(page_nb)
+        if self.fingerprint_source is None:
+            self.fingerprint_source = GLib.idle_add(self._fingerprint_next, priority = GLib.PRIORITY_LOW)
+
+
+    def _fingerprint_next(self):
+        """ Compute the fingerprint of one page from :attr:`fingerprint_queue`.
+
+        Returns:
+            `bool`: whether there are fingerprints left to compute
+        """
+        if self.fingerprint_queue:
+            page_nb = self.fingerprint_queue.pop()
+            try:
+                with self.doc_lock:
+                    if 0 <= page_nb < self.doc.nb_pages:
+                        self.doc.fingerprint(page_nb)
+            except Exception:
+                logger.error(_('Failed to compute the fingerprint of page {}').format(page_nb), exc_info = True)
+
+        if self.fingerprint_queue:
+            return GLib.SOURCE_CONTINUE
+
+        self.fingerprint_source = None
+        return GLib.SOURCE_REMOVE
+
+
+    def _load_reloaded(self, widget_name, page_nb, size, wtype):
+        """ Try to find a page in the surfaces that were cached before reloading the document.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to load
+            size (`tuple`):  the size of the widget, as a tuple of `int`
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to load
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the surface containing the page, or `None` if it needs rendering
+        """
+        if not self.reloaded_surfaces[widget_name]:
+            return None
+
+        with self.doc_lock:
+            if page_nb < 0 or page_nb >= self.doc.nb_pages:
+                return None
+            fingerprint = self.doc.fingerprint(page_nb)
+
+        with self.locks[widget_name]:
+            surface = self.reloaded_surfaces[widget_name].pop((fingerprint, size, wtype), None)
+
+        if surface is not None:
+            self.reloaded_memory -= render.surface_bytes(surface)
+        return surface
 
 
     def disable_prerender(self, widget_name):
@@ -158,9 +407,8 @@ class SurfaceCache(object):
             wtype (`int`):  type of document handled by the widget (see :attr:`surface_type`)
         """
         with self.locks[widget_name]:
-            if self.surface_type[widget_name] != wtype:
-                self.surface_type[widget_name] = wtype
-                self.surface_cache[widget_name].clear()
+            self.surface_type[widget_name] = wtype
+        self._drop_jobs(widget_name)
 
 
     def get_widget_type(self, widget_name):
@@ -182,11 +430,38 @@ class SurfaceCache(object):
             widget_name (`str`):  name of the widget that is resized
         """
         with self.locks[widget_name]:
-            self.surface_cache[widget_name].clear()
+            self._clear(widget_name)
+
+
+    def _clear(self, widget_name):
+        """ Remove all cached values for a given widget, the lock for this widget must be held.
+
+        Args:
+            widget_name (`str`):  name of the widget whose cache is cleared
+        """
+        self.surface_cache[widget_name].clear()
+        self.surface_memory[widget_name] = 0
+
+
+    def memory_usage(self, widget_name = None):
+        """ Get the memory used by cached pages.
+
+        Args:
+            widget_name (`str`):  name of the widget for which to count cached pages, or `None` for all widgets
+
+        Returns:
+            `int`: the number of bytes used by the cached surfaces
+        """
+        if widget_name is not None:
+            return self.surface_memory[widget_name]
+        return sum(self.surface_memory.values()) + self.reloaded_memory
 
 
     def resize_widget(self, widget_name, width, height):
-        """ Change the size of a registered widget, thus invalidating all the cached pages.
+        """ Change the size of a registered widget. Pages cached at other sizes are kept until they are evicted.
+
+        Rendering jobs for the widget are delayed until it has not been resized for :attr:`resize_delay` milliseconds,
+        so that we do not render pages for every intermediate size while e.g. dragging a pane.
 
         Args:
             widget_name (`str`):  name of the widget that is resized
@@ -194,9 +469,53 @@ class SurfaceCache(object):
             height (`int`):  new height of the widget
         """
         with self.locks[widget_name]:
-            if (width, height) != self.surface_size[widget_name]:
-                self.surface_cache[widget_name].clear()
-                self.surface_size[widget_name] = (width, height)
+            if (width, height) == self.surface_size[widget_name]:
+                return
+            first_size = self.surface_size[widget_name] == (-1, -1)
+            self.surface_size[widget_name] = (width, height)
+
+        self._drop_jobs(widget_name)
+        if first_size:
+            return
+
+        if widget_name in self.resizing:
+            GLib.source_remove(self.resizing[widget_name])
+        self.resizing[widget_name] = GLib.timeout_add(self.resize_delay, self._resize_done, widget_name)
+
+
+    def _resize_done(self, widget_name):
+        """ Queue the jobs of a widget that stopped resizing: pages waiting to be shown, then the prerendering.
+
+        Args:
+            widget_name (`str`):  name of the widget that was resized
+
+        Returns:
+            `bool`: `False`, to run only once when scheduled on the GLib main loop
+        """
+        del self.resizing[widget_name]
+
+        for name, page_nb in list(self.render_callbacks):
+            if name == widget_name:
+                self._queue_job(widget_name, page_nb, -1)
+
+        if widget_name in self.active_widgets:
+            for rank, page_nb in enumerate(self.prerender_pages):
+                self._queue_job(widget_name, page_nb, rank)
+
+        return GLib.SOURCE_REMOVE
+
+
+    def _cache_key(self, widget_name, page_nb):
+        """ Get the key of a page in the cache of a widget, at the widget’s current size and type.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page
+
+        Returns:
+            `tuple`: the key of the page in :attr:`surface_cache`
+        """
+        return (page_nb, self.surface_size[widget_name], self.surface_type[widget_name])
 
 
     def get(self, widget_name, page_nb):
@@ -211,12 +530,125 @@ class SurfaceCache(object):
         """
         with self.locks[widget_name]:
             pc = self.surface_cache[widget_name]
-            if page_nb in pc:
-                pc.move_to_end(page_nb)
-                return pc[page_nb]
-            else:
+            key = self._cache_key(widget_name, page_nb)
+            if key in pc:
+                pc.move_to_end(key)
+                metrics.count('cache.hit.' + widget_name)
+                return pc[key]
+            ww, wh = self.surface_size[widget_name]
+            wtype = self.surface_type[widget_name]
+
+        if ww < 0 or wh < 0:
+            return None
+
+        surface = self._load_reloaded(widget_name, page_nb, (ww, wh), wtype)
+        if surface is not None:
+            metrics.count('cache.reloaded.' + widget_name)
+            self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface)
+            return surface
+
+        if self._has_persistent(widget_name, page_nb, wtype):
+            try:
+                surface = self.surface_factory[widget_name](cairo.Format.RGB24, ww, wh)
+            except AttributeError:
                 return None
 
+            if self._load_persistent(widget_name, page_nb, wtype, surface):
+                metrics.count('cache.disk.' + widget_name)
+                self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface, persist = False)
+                return surface
+
+        metrics.count('cache.miss.' + widget_name)
+        return None
+
+
+    def get_tile(self, widget_name, key):
+        """ Fetch a cached tile of a zoomed page.
+
+        Tiles are stored with the pages of the zoomed widget, so they share its eviction priority and memory.
+
+        Args:
+            widget_name (`str`):  name of the concerned zoomed widget
+            key (`tuple`):  the page number, widget size, page type, zoom level, column, row and scale of the tile
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the cached tile if available, or `None` otherwise
+        """
+        with self.locks[widget_name]:
+            pc = self.surface_cache[widget_name]
+            if key in pc:
+                pc.move_to_end(key)
+                return pc[key]
+
+        return None
+
+
+    def set_tile(self, widget_name, key, surface):
+        """ Store a rendered tile of a zoomed page in the cache.
+
+        Args:
+            widget_name (`str`):  name of the concerned zoomed widget
+            key (`tuple`):  the page number, widget size, page type, zoom level, column, row and scale of the tile
+            surface (:class:`~cairo.ImageSurface`):  the rendered tile
+        """
+        with self.locks[widget_name]:
+            self._insert(widget_name, key, surface)
+
+        self._evict()
+
+
+    def get_placeholder(self, page_nb, wtype):
+        """ Find a page rendered at any size, e.g. for another widget, to show while rendering it at the right size.
+
+        Args:
+            page_nb (`int`):  number of the page to find
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to find
+
+        Returns:
+            :class:`~cairo.ImageSurface`: the largest cached rendering of the page, or `None` if there are none
+        """
+        found = None
+        for widget_name in self.persistent_widgets:
+            with self.locks[widget_name]:
+                for (nb, size, page_type), surface in self.surface_cache[widget_name].items():
+                    if nb == page_nb and page_type == wtype and (found is None or
+                                                                 surface.get_width() > found.get_width()):
+                        found = surface
+
+        return found
+
+
+    def _has_persistent(self, widget_name, page_nb, wtype):
+        """ Check whether a page might have been rendered in a previous session, without touching the disk.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to load
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to load
+
+        Returns:
+            `bool`: `True` iff it is worth creating a surface and calling :meth:`_load_persistent`
+        """
+        return self.disk_cache is not None and widget_name in self.persistent_widgets and \
+            self.disk_cache.has_page(page_nb, wtype)
+
+
+    def _load_persistent(self, widget_name, page_nb, wtype, surface):
+        """ Try to fill a surface with a page rendered in a previous session.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to load
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to load
+            surface (:class:`~cairo.ImageSurface`):  the surface into which to load the page
+
+        Returns:
+            `bool`: `True` iff the surface now contains the page
+        """
+        if self.disk_cache is None or widget_name not in self.persistent_widgets:
+            return False
+        return self.disk_cache.load(page_nb, wtype, surface)
+
 
     def set(self, widget_name, page_nb, val):
         """ Store a rendered page in the cache.
@@ -227,12 +659,56 @@ class SurfaceCache(object):
             val (:class:`~cairo.ImageSurface`):  content to store in the cache
         """
         with self.locks[widget_name]:
-            pc = self.surface_cache[widget_name]
-            pc[page_nb] = val
-            pc.move_to_end(page_nb)
+            self._insert(widget_name, self._cache_key(widget_name, page_nb), val)
+            wtype = self.surface_type[widget_name]
+
+        self._notify_rendered(widget_name, page_nb)
 
-            while len(pc) > self.max_pages:
-                pc.popitem(False)
+        if self.disk_cache is not None and widget_name in self.persistent_widgets:
+            self.disk_cache.store(page_nb, wtype, val)
+
+        self._evict()
+
+
+    def _insert(self, widget_name, key, surface):
+        """ Add a surface to the cache of a widget, the lock for this widget must be held.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            key (`tuple`):  the page number, widget size, and page type of the page to store in the cache
+            surface (:class:`~cairo.ImageSurface`):  content to store in the cache
+        """
+        pc = self.surface_cache[widget_name]
+        if key in pc:
+            self.surface_memory[widget_name] -= render.surface_bytes(pc[key])
+
+        pc[key] = surface
+        pc.move_to_end(key)
+        self.surface_memory[widget_name] += render.surface_bytes(surface)
+
+
+    def _evict(self):
+        """ Remove pages from the caches until the memory they use fits within :attr:`max_memory`.
+
+        Surfaces kept from before a reload are dropped first, then widgets are visited in :attr:`eviction_order`,
+        and each widget keeps at least its most recently used page.
+        """
+        if self.reloaded_memory and self.memory_usage() > self.max_memory:
+            for widget_name in self.reloaded_surfaces:
+                with self.locks[widget_name]:
+                    self.reloaded_surfaces[widget_name].clear()
+            self.reloaded_memory = 0
+
+        for widget_name in self.eviction_order:
+            if self.memory_usage() <= self.max_memory:
+                return
+
+            with self.locks[widget_name]:
+                pc = self.surface_cache[widget_name]
+                while len(pc) > 1 and self.memory_usage() > self.max_memory:
+                    key, surface = pc.popitem(False)
+                    self.surface_memory[widget_name] -= render.surface_bytes(surface)
+                    metrics.count('cache.evict.' + widget_name)
 
 
     def _create_surface(self, widget, fmt, width, height):
@@ -248,26 +724,223 @@ class SurfaceCache(object):
             :class:`~cairo.ImageSurface`: a new image surface
         """
         window = widget.get_window()
+        if window is None:
+            # Not mapped, e.g. when rendering headless: use a plain image surface
+            return render.create_surface(width, height, 1, fmt)
+
         scale = window.get_scale_factor()
         return window.create_similar_image_surface(fmt, width * scale, height * scale, scale)
 
 
-    def prerender(self, page_nb):
+    def prerender(self, page_nb, rank = 0):
         """ Queue a page for prerendering.
 
         The specified page will be prerendered for all the registered widgets.
+        Jobs already queued for the same widget, page and size are not duplicated, but get the lowest of both ranks.
 
         Args:
             page_nb (`int`):  number of the page to be prerendered
+            rank (`int`):  the order in which to render pages, lowest first
         """
-        for name in self.active_widgets:
-            GLib.idle_add(self.renderer, name, page_nb)
+        for widget_name in self.active_widgets:
+            self._queue_job(widget_name, page_nb, rank)
+
+
+    def queue_render(self, widget_name, page_nb, callback):
+        """ Render a page for a widget as soon as possible, before any prerendering.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to render
+            callback (`function`):  function to call without arguments once the page is in the cache
+        """
+        callbacks = self.render_callbacks.setdefault((widget_name, page_nb), [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+        self._queue_job(widget_name, page_nb, -1)
+
+
+    def _queue_job(self, widget_name, page_nb, rank):
+        """ Add a job to :attr:`render_queue`, unless the same job is queued with a lower or equal rank.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to render
+            rank (`int`):  the order in which to render pages, lowest first
+        """
+        if widget_name in self.resizing:
+            # Jobs are queued once the widget is done resizing
+            return
+
+        key = (widget_name, page_nb, self.surface_size[widget_name])
+        if key not in self.queued_jobs or self.queued_jobs[key][0] > rank:
+            urgency = 0 if widget_name in self.urgent_widgets else 1
+            entry = (rank, urgency, next(self.job_counter)) + key
+            self.queued_jobs[key] = entry
+            heapq.heappush(self.render_queue, entry)
+            metrics.gauge('render.queue_depth', len(self.queued_jobs))
+
+        if self.render_source is None:
+            self.render_source = GLib.idle_add(self._run_queued_job)
+
+
+    def _notify_rendered(self, widget_name, page_nb):
+        """ Call the functions waiting for a page to be rendered, see :meth:`queue_render`.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page that is now in the cache
+        """
+        for callback in self.render_callbacks.pop((widget_name, page_nb), []):
+            callback()
+
+
+    def _run_queued_job(self):
+        """ Run the most urgent job of :attr:`render_queue`, skipping cancelled and outdated jobs.
+
+        This function is scheduled on the GLib main loop as long as there are queued jobs.
+
+        Returns:
+            `bool`: whether there are jobs left to run
+        """
+        keep_running = False
+        try:
+            while self.render_queue:
+                entry = heapq.heappop(self.render_queue)
+                key = entry[3:]
+                if self.queued_jobs.get(key) is not entry:
+                    continue
+
+                del self.queued_jobs[key]
+                widget_name, page_nb, size = key
+                if size == self.surface_size[widget_name]:
+                    try:
+                        self.renderer(widget_name, page_nb)
+                    except Exception:
+                        logger.error(_('Failed to render page {} for {}').format(page_nb, widget_name), exc_info = True)
+                    break
+
+            keep_running = bool(self.queued_jobs)
+        finally:
+            # Whatever happens, never leave a source id that prevents scheduling new jobs
+            if not keep_running:
+                del self.render_queue[:]
+                self.queued_jobs.clear()
+                self.render_source = None
+
+        return GLib.SOURCE_CONTINUE if keep_running else GLib.SOURCE_REMOVE
+
+
+    def _drop_jobs(self, widget_name):
+        """ Cancel the queued jobs of a widget whose size does not match the current size.
+
+        Args:
+            widget_name (`str`):  name of the widget
+        """
+        size = self.surface_size[widget_name]
+        for key in [key for key in self.queued_jobs if key[0] == widget_name and key[2] != size]:
+            del self.queued_jobs[key]
+
+
+    def cancel_prerender(self, requested = False):
+        """ Cancel the prerendering jobs that did not run yet.
+
+        Args:
+            requested (`bool`):  whether to also cancel the jobs of :meth:`queue_render` for pages being shown
+        """
+        if requested:
+            self.queued_jobs.clear()
+        else:
+            self.queued_jobs = {key: entry for key, entry in self.queued_jobs.items() if entry[0] < 0}
+
+        self.render_queue = list(self.queued_jobs.values())
+        heapq.heapify(self.render_queue)
+
+
+    def queue_depth(self, widget_name = None):
+        """ Get the number of rendering jobs waiting to run.
+
+        Args:
+            widget_name (`str`):  name of the widget whose jobs we count, or `None` for all widgets
+
+        Returns:
+            `int`: the number of queued jobs
+        """
+        if widget_name is None:
+            return len(self.queued_jobs)
+        return sum(1 for key in self.queued_jobs if key[0] == widget_name)
+
+
+    def prerender_around(self, page_nb):
+        """ Prerender the pages that are likely to be shown after the given page, which is being shown.
+
+        Previously queued jobs are cancelled, and the pages from :meth:`prerender_plan` are queued
+        by decreasing likelihood, so that the most likely pages are rendered first.
+
+        Args:
+            page_nb (`int`):  number of the page that is shown
+        """
+        self.page_visits.append((time.monotonic(), page_nb))
+        self.cancel_prerender()
+
+        self.prerender_pages = self.prerender_plan(page_nb)
+        for rank, page in enumerate(self.prerender_pages):
+            self.prerender(page, rank)
+
+
+    def prerender_plan(self, page_nb):
+        """ List the pages to prerender, from the most to the least likely to be shown next.
+
+        The recent page changes tell us in which direction the presentation goes, and whether pages are skipped
+        through in a burst, in which case we look further ahead. After jumping, we also prerender the page we jumped
+        from, and after jumping to the next label, the following label if the labels are already indexed.
+        The number of pages prerendered in the direction of the presentation depends on the measured cost
+        of rendering a page, see :attr:`render_cost`.
+
+        Args:
+            page_nb (`int`):  number of the page that is shown
+
+        Returns:
+            `list` of `int`: the page numbers to prerender
+        """
+        with self.doc_lock:
+            doc = self.doc
+        nb_pages = doc.pages_number()
+
+        if self.render_cost:
+            depth = int(self.prerender_budget / (self.render_cost * max(1, len(self.active_widgets))))
+        else:
+            depth = self.prerender_depth
+
+        visits = list(self.page_visits)
+        moves = [(t2 - t1, p2 - p1) for (t1, p1), (t2, p2) in zip(visits, visits[1:])]
+        last_move = moves[-1][1] if moves else 1
+        direction = -1 if -self.min_prerender_depth <= last_move < 0 else 1
+
+        if len(moves) >= 2 and all(delay < self.burst_interval and move == last_move for delay, move in moves[-2:]):
+            # Skipping through pages: the next few pages are likely to be skipped too
+            depth *= 2
+
+        depth = min(max(depth, self.min_prerender_depth), self.max_prerender_depth)
+
+        plan = [page_nb, page_nb + direction]
+        if abs(last_move) > 1 and len(visits) >= 2:
+            # After a jump, e.g. following a link, presenters often come back
+            plan.append(visits[-2][1])
+            # Only once labels are indexed in the background, rather than fetch all of them while changing pages
+            if last_move > 0 and doc.page_labels.is_indexed() and doc.label_after(visits[-2][1]) == page_nb:
+                plan.append(doc.label_after(page_nb))
+
+        plan.extend(page_nb + direction * n for n in range(2, depth + 1))
+        plan.extend(page_nb - direction * n for n in range(1, depth // 2 + 1))
+
+        return [page for page in collections.OrderedDict.fromkeys(plan) if 0 <= page < nb_pages]
 
 
     def renderer(self, widget_name, page_nb):
         """ Rendering function.
 
-        This function is meant to be scheduled on the GLib main loop. When run,
+        This function is run from the GLib main loop for jobs of :attr:`render_queue`. When run,
         it will go through the following steps:
 
         - check if the job's result is not already available in the cache
@@ -275,26 +948,55 @@ class SurfaceCache(object):
         - store it in the cache if it was not added there since the beginning of
           the process and the widget configuration is still valid
 
+        When rasterizing pages ourselves, the page is rendered first for the largest widget that needs it,
+        then downscaled for the others.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to store in the cache
+        """
+        if self.render_pool is None:
+            with self.locks[widget_name]:
+                cached = self._cache_key(widget_name, page_nb) in self.surface_cache[widget_name]
+                wtype = self.surface_type[widget_name]
+
+            larger = None if cached else self._larger_widget(widget_name, page_nb, wtype)
+            if larger is not None:
+                self._render(larger, page_nb)
+
+        return self._render(widget_name, page_nb)
+
+
+    @metrics.timed('cache.render', lambda self, widget_name, page_nb: widget_name)
+    def _render(self, widget_name, page_nb):
+        """ Render a page for a widget, unless it is in the cache already, and store it in the cache.
+
         Args:
             widget_name (`str`):  name of the concerned widget
             page_nb (`int`):  number of the page to store in the cache
         """
         with self.locks[widget_name]:
-            if page_nb in self.surface_cache[widget_name]:
-                # Already in cache
-                return GLib.SOURCE_REMOVE
+            cached = self._cache_key(widget_name, page_nb) in self.surface_cache[widget_name]
             ww, wh = self.surface_size[widget_name]
             wtype = self.surface_type[widget_name]
 
+        if cached:
+            self._notify_rendered(widget_name, page_nb)
+            return GLib.SOURCE_REMOVE
+
         if ww < 0 or wh < 0:
             logger.warning('Widget {} with invalid size {}x{} when rendering'.format(widget_name, ww, wh))
             return GLib.SOURCE_REMOVE
 
         with self.doc_lock:
-            page = self.doc.page(page_nb)
-            if page is None:
+            if not 0 <= page_nb < self.doc.pages_number():
                 return GLib.SOURCE_REMOVE
 
+        surface = self._load_reloaded(widget_name, page_nb, (ww, wh), wtype)
+        if surface is not None:
+            self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface)
+            return GLib.SOURCE_REMOVE
+
         # Render to a ImageSurface
         try:
             surface = self.surface_factory[widget_name](cairo.Format.RGB24, ww, wh)
@@ -302,23 +1004,676 @@ class SurfaceCache(object):
             logger.warning('Widget {} was not mapped when rendering'.format(widget_name), exc_info = True)
             return GLib.SOURCE_REMOVE
 
+        if self._has_persistent(widget_name, page_nb, wtype) and \
+                self._load_persistent(widget_name, page_nb, wtype, surface):
+            self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface, persist = False)
+            return GLib.SOURCE_REMOVE
+
+        if self._downscale_cached(page_nb, wtype, surface, (ww, wh)):
+            self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface)
+            return GLib.SOURCE_REMOVE
+
+        if self.render_pool is not None and self.render_pool.can_render():
+            store = functools.partial(self._store_rendered, widget_name, page_nb, (ww, wh), wtype)
+            self.render_pool.render((widget_name, page_nb, ww, wh), page_nb, surface, ww, wh, wtype, store)
+            return GLib.SOURCE_REMOVE
+
+        # Only build the page when we rasterize it ourselves
+        with self.doc_lock:
+            page = self.doc.page(page_nb)
+
+        self.measure_render_cost(render.render_page(page, surface, ww, wh, wtype))
+
+        self._store_rendered(widget_name, page_nb, (ww, wh), wtype, surface)
+        return GLib.SOURCE_REMOVE
+
+
+    def _larger_widget(self, widget_name, page_nb, wtype):
+        """ Find the largest widget that is going to need a page of the same type, but does not have it in cache.
+
+        Widgets being resized are ignored, as their size is about to change.
+
+        Args:
+            widget_name (`str`):  name of the widget for which we are rendering
+            page_nb (`int`):  number of the page to render
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to render
+
+        Returns:
+            `str`: the name of a widget larger than ``widget_name``, or `None` if there are none
+        """
+        ww, wh = self.surface_size[widget_name]
+        found = None
+        for name in self.active_widgets:
+            if name in self.resizing:
+                continue
+
+            with self.locks[name]:
+                if self.surface_type[name] != wtype or self._cache_key(name, page_nb) in self.surface_cache[name]:
+                    continue
+                w, h = self.surface_size[name]
+
+            if w >= ww and h >= wh and w * h > ww * wh and (found is None or w * h > found[1]):
+                found = (name, w * h)
+
+        return found[0] if found is not None else None
+
+
+    def _downscale_cached(self, page_nb, wtype, surface, size):
+        """ Fill a surface by downscaling a larger rendering of the page, from the cache of any widget.
+
+        Scaling down with cairo is much faster than having Poppler rasterize the page again.
+
+        Args:
+            page_nb (`int`):  number of the page to render
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to render
+            surface (:class:`~cairo.ImageSurface`):  the surface to fill
+            size (`tuple`):  the size of the widget, as a tuple of `int`
+
+        Returns:
+            `bool`: `True` iff the surface now contains the page
+        """
+        source = self.get_placeholder(page_nb, wtype)
+        if source is None or source.get_width() < surface.get_width() or source.get_height() < surface.get_height():
+            return False
+
         context = cairo.Context(surface)
-        page.render_cairo(context, ww, wh, wtype)
+        self.paint_scaled(context, source, page_nb, wtype, size)
         del context
 
-        # Save if possible and necessary
+        return True
+
+
+    def paint_scaled(self, context, source, page_nb, wtype, size):
+        """ Paint a rendering of a page, made for a widget of any size, onto a widget of the given size.
+
+        The page area of the rendering is scaled uniformly, so the page keeps its aspect ratio whatever the aspect
+        ratio of the widget for which it was rendered.
+
+        Args:
+            context (:class:`~cairo.Context`):  the context on which to paint
+            source (:class:`~cairo.ImageSurface`):  the rendering of the page
+            page_nb (`int`):  number of the page
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page
+            size (`tuple`):  the size of the widget, as a tuple of `int`
+        """
+        ww, wh = size
+        with self.doc_lock:
+            pw, ph = self.doc.page_size(page_nb, wtype)
+        sx, sy = source.get_device_scale()
+        source_scale = min(source.get_width() / sx / pw, source.get_height() / sy / ph)
+        scale = min(ww / pw, wh / ph)
+
+        context.save()
+        context.rectangle(0, 0, pw * scale, ph * scale)
+        context.clip()
+        context.scale(scale / source_scale, scale / source_scale)
+        context.set_source_surface(source, 0, 0)
+        context.get_source().set_filter(cairo.Filter.GOOD)
+        context.paint()
+        context.restore()
+
+
+    def measure_render_cost(self, duration):
+        """ Update the average rendering cost of a page with a new measure.
+
+        Args:
+            duration (`float`):  the number of seconds spent rendering a page
+        """
+        if self.render_cost is None:
+            self.render_cost = duration
+        else:
+            self.render_cost = .8 * self.render_cost + .2 * duration
+
+
+    def _store_rendered(self, widget_name, page_nb, size, wtype, surface, persist = True):
+        """ Save a rendered page in the cache if possible and necessary.
+
+        Args:
+            widget_name (`str`):  name of the concerned widget
+            page_nb (`int`):  number of the page to store in the cache
+            size (`tuple`): size of the widget for which the page was rendered
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page that was rendered
+            surface (:class:`~cairo.ImageSurface`): the rendered page
+            persist (`bool`): whether to also write the page to the disk cache
+        """
+        key = (page_nb, size, wtype)
         with self.locks[widget_name]:
-            pc = self.surface_cache[widget_name]
-            if (ww, wh) == self.surface_size[widget_name] and page_nb not in pc:
-                pc[page_nb] = surface
-                pc.move_to_end(page_nb)
+            cached = key in self.surface_cache[widget_name]
+            if not cached:
+                self._insert(widget_name, key, surface)
+            current = key == self._cache_key(widget_name, page_nb)
 
-            while len(pc) > self.max_pages:
-                pc.popitem(False)
+        if current:
+            self._notify_rendered(widget_name, page_nb)
+        if cached:
+            return
+
+        if widget_name in self.persistent_widgets:
+            self._queue_fingerprint(page_nb)
+
+        if persist and self.disk_cache is not None and widget_name in self.persistent_widgets:
+            self.disk_cache.store(page_nb, wtype, surface)
+
+        self._evict()
+
+
+    def shutdown(self):
+        """ Stop the worker processes and the disk cache’s writer thread, if any.
+        """
+        if self.render_pool is not None:
+            self.render_pool.close()
+            self.render_pool = None
+
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+            self.disk_cache = None
+
+
+
+class RenderPool(object):
+    """ A pool of worker processes, that each open the current document and render its pages into shared memory.
+
+    Poppler is not threadsafe, but separate processes with separate documents can render concurrently.
+    Results are copied into surfaces created on the main thread, and passed to a callback on the main loop.
+
+    Args:
+        processes (`int`): The number of worker processes
+    """
+    #: The :class:`~multiprocessing.pool.Pool` of worker processes
+    pool = None
+
+    #: `tuple` of the current document’s URI and :attr:`generation`, `None` if the document can not be rendered
+    doc_key = None
+
+    #: `int` incremented on every document swap, so that results for a previous document are discarded
+    generation = 0
+
+    #: `set` of the identifiers of jobs that are submitted and not yet completed
+    pending = set()
+
+    #: `dict` of the :class:`~multiprocessing.shared_memory.SharedMemory` buffers of submitted jobs, by name.
+    #: Buffers are created and removed by the main process, including those of jobs still running when closing.
+    segments = {}
+
+    def __init__(self, processes):
+        # Do not fork a process that is running Gtk (and other threads), start fresh interpreters instead.
+        context = multiprocessing.get_context('spawn')
+        self.pool = context.Pool(processes, initializer=render.init_worker)
+        self.pending = set()
+        self.segments = {}
+
+
+    def swap_document(self, new_doc):
+        """ Render pages from a new document, and ignore pending results from the previous one.
+
+        Args:
+            new_doc (:class:`~pympress.document.Document`):  the new document
+        """
+        self.generation += 1
+        uri = new_doc.get_uri()
+        self.doc_key = (uri, self.generation) if uri is not None else None
+        self.pending.clear()
+
+
+    def can_render(self):
+        """ Whether the current document can be rendered by the workers.
+
+        Returns:
+            `bool`: `True` iff there is a document that the workers can open
+        """
+        return self.doc_key is not None
+
+
+    def render(self, job, page_nb, surface, ww, wh, wtype, callback):
+        """ Queue the rendering of a page in a worker process.
+
+        Args:
+            job (`tuple`): an identifier of this job, jobs already pending are not submitted again
+            page_nb (`int`): number of the page to render
+            surface (:class:`~cairo.ImageSurface`): the surface into which to copy the rendered page
+            ww (`int`): width of the widget in which the page is displayed
+            wh (`int`): height of the widget in which the page is displayed
+            wtype (:class:`~pympress.document.PdfPage`): the type of page to render
+            callback (`function`): called with the surface, on the main loop, once it contains the rendered page
+        """
+        if job in self.pending:
+            return
+        self.pending.add(job)
+
+        shm = shared_memory.SharedMemory(create = True, size = surface.get_stride() * surface.get_height())
+        self.segments[shm.name] = shm
+
+        args = (self.doc_key, page_nb, shm.name, surface.get_width(), surface.get_height(), surface.get_stride(),
+                surface.get_device_scale(), ww, wh, int(wtype))
+        done = functools.partial(self._completed, job, self.doc_key, shm.name, surface, callback)
+        failed = functools.partial(self._failed, job, shm.name)
+
+        self.pool.apply_async(render.render_shared, args, callback = lambda res: GLib.idle_add(done, res),
+                              error_callback = lambda err: GLib.idle_add(failed, err))
+
+
+    def _completed(self, job, doc_key, name, surface, callback, result):
+        """ Copy the rendered page from shared memory into its surface, then pass it on.
+
+        Args:
+            job (`tuple`): the identifier of the job
+            doc_key (`tuple`): the key of the document rendered by the job
+            name (`str`): the name of the shared memory buffer containing the rendered page
+            surface (:class:`~cairo.ImageSurface`): the surface into which to copy the rendered page
+            callback (`function`): the function to which to pass the surface
+            result (`None`): the return value of :func:`~pympress.render.render_shared`
+        """
+        shm = self.segments.pop(name, None)
+        if shm is None:
+            # the pool was closed in the meantime
+            return GLib.SOURCE_REMOVE
+
+        try:
+            if doc_key != self.doc_key:
+                return GLib.SOURCE_REMOVE
+
+            self.pending.discard(job)
+
+            surface.flush()
+            data = surface.get_data()
+            data[:] = shm.buf[:len(data)]
+            del data
+            surface.mark_dirty()
+
+            callback(surface)
+        finally:
+            shm.close()
+            shm.unlink()
 
         return GLib.SOURCE_REMOVE
 
 
+    def _failed(self, job, name, error):
+        """ Log errors that happened in a worker process.
+
+        Args:
+            job (`tuple`): the identifier of the job
+            name (`str`): the name of the shared memory buffer of the job
+            error (`Exception`): the exception that was raised
+        """
+        shm = self.segments.pop(name, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+        self.pending.discard(job)
+        logger.error('Failed rendering page in worker process: {}'.format(error))
+        return GLib.SOURCE_REMOVE
+
+
+    def close(self):
+        """ Terminate the worker processes.
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+        for shm in self.segments.values():
+            shm.close()
+            shm.unlink()
+        self.segments.clear()
+
+
+
+class DiskCache(object):
+    """ Keep rendered pages on disk, to display them immediately when opening a document again.
+
+    Pages are stored compressed, in one directory per document, named after the hash of the document’s content.
+    Files are keyed by page number, page type, and pixel size and scale of the surface. The least recently used
+    files are removed when the total size exceeds the limit, and the pages of a file are dropped when its content
+    (and thus its hash) changes.
+
+    Writing happens in a separate thread, which only handles bytes and never touches Gtk or Poppler objects.
+
+    Args:
+        base_dir (`str`): The directory in which to store the cached pages
+        max_size (`int`): The maximum number of bytes to use on disk
+    """
+    #: `str` path to the directory containing the cached pages of all documents
+    base_dir = None
+
+    #: `int` maximum number of bytes that the cached pages can use on disk
+    max_size = 0
+
+    #: `str` path to the directory for the current document, or `None` if there is no document to cache,
+    #: or until the writer thread has hashed the document
+    doc_dir = None
+
+    #: `set` of the page numbers and types, as `tuple`, of which some rendering is stored in :attr:`doc_dir`
+    doc_pages = set()
+
+    #: `int` incremented on every document swap, so that the directory of a previous document is not enabled
+    generation = 0
+
+    #: `int` number of bytes currently used on disk, only accessed from the writer thread
+    disk_usage = 0
+
+    #: `float` fraction of :attr:`max_size` down to which the cache is trimmed when it exceeds :attr:`max_size`,
+    #: so that the cache directory is not scanned on every write once it is full
+    low_water = .8
+
+    #: :class:`~queue.Queue` of tasks for the writer thread
+    tasks = None
+
+    #: :class:`~threading.Thread` writing pages and removing outdated files
+    writer = None
+
+    #: Name of the file, in each document’s directory, that holds the path of the document
+    source_file = 'source'
+
+    def __init__(self, base_dir, max_size):
+        self.base_dir = base_dir
+        self.max_size = max_size
+        self.doc_pages = set()
+        self.tasks = queue.Queue()
+
+        self.writer = threading.Thread(target = self._process_tasks, name = 'pympress-disk-cache', daemon = True)
+        self.writer.start()
+        self.trim()
+
+
+    @staticmethod
+    def hash_file(path):
+        """ Compute the hash of a file’s content.
+
+        Args:
+            path (`str`): The path to the file
+
+        Returns:
+            `str`: the hexadecimal digest of the file
+        """
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+    def swap_document(self, uri):
+        """ Start caching the pages of a new document, and drop outdated pages of the same document.
+
+        The document is hashed by the writer thread, pages are neither loaded nor stored until then.
+
+        Args:
+            uri (`str`): URI of the new document, or `None` if there is no document
+        """
+        self.generation += 1
+        self.doc_dir = None
+        if uri is None or not uri.startswith('file://'):
+            return
+
+        self.tasks.put((self._claim_directory, (url2pathname(uri[len('file://'):]), self.generation)))
+
+
+    def has_page(self, page_nb, wtype):
+        """ Check cheaply whether a page might be cached, before allocating a surface to load it into.
+
+        Args:
+            page_nb (`int`): number of the page
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+
+        Returns:
+            `bool`: `True` iff the page is stored at some size in the cache of the current document
+        """
+        return self.doc_dir is not None and (page_nb, int(wtype)) in self.doc_pages
+
+
+    def _page_file(self, page_nb, wtype, surface):
+        """ Get the path of the file that holds a rendered page.
+
+        Args:
+            page_nb (`int`): number of the page
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            surface (:class:`~cairo.ImageSurface`): the surface, which gives the pixel size and scale of the page
+
+        Returns:
+            `str`: the path to the file
+        """
+        name = self.page_filename(page_nb, wtype, surface.get_width(), surface.get_height(),
+                                  surface.get_device_scale()[0])
+        return os.path.join(self.doc_dir, name)
+
+
+    @staticmethod
+    def page_filename(page_nb, wtype, width, height, scale):
+        """ Get the name of the file that holds a rendered page, in its document’s directory.
+
+        Args:
+            page_nb (`int`): number of the page
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            width (`int`): width of the surface in pixels
+            height (`int`): height of the surface in pixels
+            scale (`float`): device scale of the surface
+
+        Returns:
+            `str`: the name of the file
+        """
+        return '{}-{}-{}x{}@{:g}.z'.format(page_nb, int(wtype), width, height, scale)
+
+
+    @staticmethod
+    def write_file(filename, pixels):
+        """ Compress the pixels of a page and write them atomically to a file.
+
+        Args:
+            filename (`str`): The path of the file to write
+            pixels (`bytes`): The data of the surface
+        """
+        tmp_file = filename + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(zlib.compress(pixels, 1))
+        os.replace(tmp_file, filename)
+
+
+    def load(self, page_nb, wtype, surface):
+        """ Fill a surface with a cached page, if it exists.
+
+        Args:
+            page_nb (`int`): number of the page
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            surface (:class:`~cairo.ImageSurface`): the RGB24 surface to fill
+
+        Returns:
+            `bool`: `True` iff the page was found in the cache and loaded into the surface
+        """
+        if self.doc_dir is None:
+            return False
+
+        filename = self._page_file(page_nb, wtype, surface)
+        try:
+            with open(filename, 'rb') as f:
+                pixels = zlib.decompress(f.read())
+            os.utime(filename)
+        except (OSError, zlib.error):
+            return False
+
+        surface.flush()
+        data = surface.get_data()
+        if len(data) != len(pixels):
+            return False
+
+        data[:] = pixels
+        del data
+        surface.mark_dirty()
+        return True
+
+
+    def store(self, page_nb, wtype, surface):
+        """ Queue a rendered page to be written to disk.
+
+        Args:
+            page_nb (`int`): number of the page
+            wtype (:class:`~pympress.document.PdfPage`): the type of page
+            surface (:class:`~cairo.ImageSurface`): the RGB24 surface containing the rendered page
+        """
+        if self.doc_dir is None:
+            return
+
+        surface.flush()
+        self.tasks.put((self._write, (self._page_file(page_nb, wtype, surface), bytes(surface.get_data()))))
+
+
+    def flush(self):
+        """ Wait until the writer thread has run all the tasks queued so far.
+        """
+        done = threading.Event()
+        self.tasks.put((done.set, ()))
+        done.wait()
+
+
+    def trim(self):
+        """ Queue the removal of the least recently used pages, until the cache fits in :attr:`max_size`.
+
+        This also measures the space used on disk, e.g. after other processes added pages to the cache.
+        """
+        self.tasks.put((self._trim, ()))
+
+
+    def close(self):
+        """ Finish writing pages and stop the writer thread.
+        """
+        self.tasks.put(None)
+        self.writer.join()
+
+
+    def _process_tasks(self):
+        """ Main function of the writer thread: run tasks until a `None` task is received.
+        """
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+
+            function, args = task
+            try:
+                function(*args)
+            except Exception:
+                logger.exception('Error in disk cache of rendered pages')
+
+
+    def _claim_directory(self, path, generation):
+        """ Hash a document, create its directory, and remove directories of previous versions of the same file.
+
+        The directory is then used to load and store pages, unless another document was swapped in meanwhile.
+
+        Args:
+            path (`str`): The path to the document
+            generation (`int`): The value of :attr:`generation` when the document was swapped in
+        """
+        try:
+            doc_dir = os.path.join(self.base_dir, self.hash_file(path))
+        except OSError:
+            logger.warning('Can not hash {} to cache its pages'.format(path), exc_info = True)
+            return
+
+        for entry in os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []:
+            other_dir = os.path.join(self.base_dir, entry)
+            if other_dir == doc_dir:
+                continue
+            try:
+                with open(os.path.join(other_dir, self.source_file)) as f:
+                    outdated = f.read() == path
+            except OSError:
+                outdated = False
+
+            if outdated:
+                shutil.rmtree(other_dir, ignore_errors = True)
+
+        os.makedirs(doc_dir, exist_ok = True)
+        with open(os.path.join(doc_dir, self.source_file), 'w') as f:
+            f.write(path)
+
+        if generation == self.generation:
+            self.doc_pages = self._list_pages(doc_dir)
+            self.doc_dir = doc_dir
+
+
+    def _list_pages(self, doc_dir):
+        """ List the pages stored in a document’s directory.
+
+        Args:
+            doc_dir (`str`): The directory of the document
+
+        Returns:
+            `set`: the page numbers and types, as `tuple` of `int`, of the stored pages
+        """
+        pages = set()
+        for name in os.listdir(doc_dir):
+            try:
+                page_nb, wtype, rest = name.split('-', 2)
+                pages.add((int(page_nb), int(wtype)))
+            except ValueError:
+                continue
+        return pages
+
+
+    def _write(self, filename, pixels):
+        """ Compress and write a page to disk, then trim the cache if needed.
+
+        Args:
+            filename (`str`): The path of the file to write
+            pixels (`bytes`): The data of the surface
+        """
+        if not os.path.isdir(os.path.dirname(filename)):
+            # document was swapped and its directory removed
+            return
+
+        if os.path.exists(filename):
+            self.disk_usage -= os.path.getsize(filename)
+
+        self.write_file(filename, pixels)
+        self.disk_usage += os.path.getsize(filename)
+        if os.path.dirname(filename) == self.doc_dir:
+            page_nb, wtype, rest = os.path.basename(filename).split('-', 2)
+            self.doc_pages.add((int(page_nb), int(wtype)))
+
+        if self.disk_usage > self.max_size:
+            self._trim(self.max_size * self.low_water)
+
+
+    def _trim(self, target = None):
+        """ Remove the least recently used pages until the cache fits in :attr:`max_size`, or in a smaller target.
+
+        Args:
+            target (`int`): The number of bytes to which the cache is reduced, by default :attr:`max_size`
+        """
+        if target is None:
+            target = self.max_size
+
+        if not os.path.isdir(self.base_dir):
+            return
+
+        files = []
+        for root, dirs, names in os.walk(self.base_dir):
+            for name in names:
+                if name == self.source_file:
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        self.disk_usage = sum(size for mtime, size, path in files)
+        removed = False
+        for mtime, size, path in sorted(files):
+            if self.disk_usage <= target:
+                break
+            os.remove(path)
+            self.disk_usage -= size
+            removed = True
+
+        doc_dir = self.doc_dir
+        if removed and doc_dir is not None and os.path.isdir(doc_dir):
+            self.doc_pages = self._list_pages(doc_dir)
+
+        for entry in os.listdir(self.base_dir):
+            doc_dir = os.path.join(self.base_dir, entry)
+            if doc_dir != self.doc_dir and os.path.isdir(doc_dir) and os.listdir(doc_dir) == [self.source_file]:
+                shutil.rmtree(doc_dir, ignore_errors = True)
+
+
 ##
 # Local Variables:
 # mode: python
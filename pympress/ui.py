@@ -39,6 +39,8 @@ logger = logging.getLogger(__name__)
 import os.path
 import sys
 import gc
+import math
+import threading
 
 import gi
 import cairo
@@ -46,7 +48,8 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import GObject, Gtk, Gdk, GLib, GdkPixbuf, Gio
 
 
-from pympress import document, surfacecache, util, pointer, scribble, builder, talk_time, extras, editable_label
+from pympress import (document, surfacecache, render, metrics, util, pointer, scribble, builder, talk_time, extras,
+                      editable_label, overview)
 
 
 class UI(builder.Builder):
@@ -105,6 +108,9 @@ class UI(builder.Builder):
     #: :class:`~Gtk.ToolButton` big button for touch screens, go to scribble on screen
     highlight_button = None
 
+    #: `int` counting the documents requested to be opened, to drop those opened after a more recent request
+    open_requests = 0
+
     #: number of page currently displayed in Content window's miniatures
     current_page = -1
     #: number of page currently displayed in Presenter window's miniatures
@@ -123,6 +129,12 @@ class UI(builder.Builder):
 
     #: :class:`~pympress.surfacecache.SurfaceCache` instance.
     cache = None
+    #: :class:`~pympress.document.MediaStore` where media embedded in documents are extracted, or `None`
+    media_store = None
+    #: `bool` whether cache misses first show a low-resolution page, and render the full page at idle time
+    progressive_render = True
+    #: `int` by how much to reduce the resolution of pages shown while the full page renders
+    low_res_factor = 4
 
     #: Current :class:`~pympress.document.Document` instance.
     doc = document.EmptyDocument()
@@ -146,6 +158,10 @@ class UI(builder.Builder):
     est_time = None
     #: :class:`~pympress.extras.TimingReport` popup to show how much time was spent on which part
     timing = None
+    #: :class:`~pympress.overview.Overview` grid of all slides, to go to any of them
+    slide_overview = None
+    #: :class:`~pympress.extras.Search` window to search the text of the document
+    search = None
     #: :class:`~pympress.talk_time.TimeCounter` clock tracking talk time (elapsed, and remaining)
     talk_time = None
 
@@ -193,7 +209,14 @@ class UI(builder.Builder):
         self.show_bigbuttons = self.config.getboolean('presenter', 'show_bigbuttons')
 
         # Surface cache
-        self.cache = surfacecache.SurfaceCache(self.doc, self.config.getint('cache', 'maxpages'))
+        self.cache = surfacecache.SurfaceCache(self.doc, self.config.getint('cache', 'maxmemory') << 20,
+                                               self.config.getint('cache', 'render_processes', fallback=0),
+                                               self.config.getint('cache', 'disk_size', fallback=0) << 20)
+        self.progressive_render = self.config.getboolean('cache', 'progressive_render', fallback=True)
+
+        media_size = self.config.getint('cache', 'media_size', fallback=0) << 20
+        if media_size > 0:
+            self.media_store = document.MediaStore(os.path.join(util.get_cache_path(), 'media'), media_size)
 
         # Make and populate windows
         self.load_ui('presenter')
@@ -238,6 +261,7 @@ class UI(builder.Builder):
             'hist-forward':      dict(activate=self.doc_hist_next),
             'first-page':        dict(activate=self.doc_goto_home),
             'last-page':         dict(activate=self.doc_goto_end),
+            'overview':          dict(activate=self.show_overview),
         })
 
         self.zoom = extras.Zoom(self)
@@ -248,6 +272,8 @@ class UI(builder.Builder):
         self.est_time = editable_label.EstimatedTalkTime(self)
         self.page_number = editable_label.PageNumber(self, self.config.getboolean('presenter', 'scroll_number'))
         self.timing = extras.TimingReport(self)
+        self.slide_overview = overview.Overview(self)
+        self.search = extras.Search(self)
         self.talk_time = talk_time.TimeCounter(self, self.est_time, self.timing)
         self.file_watcher = extras.FileWatcher()
         self.config.register_actions(self)
@@ -316,9 +342,10 @@ class UI(builder.Builder):
 
         page_type = self.notes_mode.complement()
 
-        self.cache.add_widget(self.c_da, page_type)
+        # The content window’s pages are the biggest, and the first ones to be evicted when memory is short
+        self.cache.add_widget(self.c_da, page_type, priority = 1, urgent = True)
         self.cache.add_widget(self.c_da, page_type, zoomed = True)
-        self.c_frame.set_property("ratio", self.doc.page(self.current_page).get_aspect_ratio(page_type))
+        self.c_frame.set_property("ratio", self.doc.get_aspect_ratio(self.current_page, page_type))
 
         colourclass = 'white' if self.config.getboolean('content', 'white_blanking') else 'black'
         self.c_da.get_style_context().add_class(colourclass)
@@ -336,11 +363,11 @@ class UI(builder.Builder):
         self.pane_handle_pos.update(pane_handles)
 
         slide_type = self.notes_mode.complement()
-        self.cache.add_widget(self.p_da_cur, slide_type)
+        self.cache.add_widget(self.p_da_cur, slide_type, priority = 2, urgent = True)
         self.cache.add_widget(self.p_da_cur, slide_type, zoomed = True)
-        self.cache.add_widget(self.p_da_next, slide_type)
-        self.cache.add_widget(self.p_da_notes, self.notes_mode, prerender_enabled = bool(self.notes_mode))
-        self.cache.add_widget(self.scribbler.scribble_p_da, slide_type, prerender_enabled = False)
+        self.cache.add_widget(self.p_da_next, slide_type, priority = 3)
+        self.cache.add_widget(self.p_da_notes, self.notes_mode, prerender_enabled = bool(self.notes_mode), priority = 2)
+        self.cache.add_widget(self.scribbler.scribble_p_da, slide_type, prerender_enabled = False, priority = 1)
         self.cache.add_widget(self.scribbler.scribble_p_da, slide_type, zoomed = True)
 
         # set default value
@@ -465,7 +492,7 @@ class UI(builder.Builder):
         """ Manage "configure" events for all drawing areas, e.g. resizes.
 
         We tell the local :class:`~pympress.surfacecache.SurfaceCache` cache about it, so that it can
-        invalidate its internal cache for the specified widget and pre-render next pages at a correct size.
+        cache and pre-render pages for the specified widget at the correct size.
 
         Warning: Some not-explicitly sent signals contain wrong values! Just don't resize in that case,
         since these always seem to happen after a correct signal that was sent explicitly.
@@ -566,6 +593,7 @@ class UI(builder.Builder):
         self.medias.hide_all()
 
         self.doc.cleanup_media_files()
+        self.cache.shutdown()
 
         if self.app.get_action_state('content-fullscreen'):
             # In case we used hard-disabling
@@ -605,17 +633,76 @@ class UI(builder.Builder):
     def swap_document(self, doc_uri, page=0, reloading=False):
         """ Replace the currently open document with a new one.
 
-        The new document is possibly and EmptyDocument if doc_uri is None.
-        The state of the ui and cache are updated accordingly.
+        The new document is possibly and EmptyDocument if doc_uri is None. Other documents are opened in a separate
+        thread, so that the windows stay responsive while a large document loads, and then shown by
+        :meth:`show_document`.
 
         Args:
             doc_uri (`str`): the URI to the new document
             page (`int`): the page at which to start the presentation
             reloading (`bool`): whether we are reloading or detecting stuff from the document
         """
-        run_gc = self.doc.doc is not None
+        self.open_requests += 1
+
+        if doc_uri is None:
+            self.show_document(self.open_requests, None, document.Document.create(self, None), page, reloading)
+        else:
+            threading.Thread(target = self.open_document, args = (self.open_requests, doc_uri, page, reloading),
+                             name = 'pympress-open-document', daemon = True).start()
+
+
+    def open_document(self, request, doc_uri, page, reloading):
+        """ Open a document, in a separate thread, and have it shown on the main thread.
+
+        The Poppler document is only used by this thread until it is handed over to the main loop.
+        Any error is logged here and reported on the main loop by :meth:`show_document`, as a document that
+        could not be opened.
+
+        Args:
+            request (`int`): the number of the request to open this document, see :attr:`open_requests`
+            doc_uri (`str`): the URI to the new document
+            page (`int`): the page at which to start the presentation
+            reloading (`bool`): whether we are reloading or detecting stuff from the document
+        """
         try:
-            self.doc = document.Document.create(self, doc_uri)
+            doc = document.Document.create(self, doc_uri)
+            if doc.nb_pages > 0:
+                # Read the sizes of all pages here rather than on the main thread, e.g. to guess the notes mode
+                doc.page_size(0)
+        except GLib.Error:
+            logger.warning('Error opening document {}'.format(doc_uri), exc_info = True)
+            doc = None
+        except Exception:
+            logger.exception('Unexpected error opening document {}'.format(doc_uri))
+            doc = None
+
+        GLib.idle_add(self.show_document, request, doc_uri, doc, page, reloading)
+
+
+    def show_document(self, request, doc_uri, doc, page, reloading):
+        """ Show a newly opened document, and update the state of the ui and cache accordingly.
+
+        The first page is shown first, then labels, outline and text index of the document are read when idle.
+
+        Args:
+            request (`int`): the number of the request to open this document, see :attr:`open_requests`
+            doc_uri (`str`): the URI to the new document
+            doc (:class:`~pympress.document.Document`): the opened document, or `None` if it could not be opened
+            page (`int`): the page at which to start the presentation
+            reloading (`bool`): whether we are reloading or detecting stuff from the document
+
+        Returns:
+            `bool`: `False`, to run only once (:func:`~GLib.idle_add` convention)
+        """
+        if request != self.open_requests:
+            # Another document was requested in the meantime
+            return False
+
+        run_gc = self.doc.doc is not None
+        old_doc = self.doc
+
+        if doc is not None:
+            self.doc = doc
 
             if not reloading and doc_uri:
                 Gtk.RecentManager.get_default().add_item(doc_uri)
@@ -624,9 +711,9 @@ class UI(builder.Builder):
             elif not reloading:
                 self.file_watcher.stop_watching()
 
-        except GLib.Error:
+        else:
             if reloading:
-                return
+                return False
 
             self.doc = document.Document.create(self, None)
             self.error_opening_file(doc_uri)
@@ -635,6 +722,9 @@ class UI(builder.Builder):
         self.current_page = self.preview_page = self.doc.goto(page)
         self.doc.goto(self.current_page)
 
+        if reloading:
+            self.doc.reuse_dests(old_doc)
+
         # Guess notes mode by default if the document has notes
         if not reloading:
             hpref = self.config.get('notes position', 'horizontal')
@@ -651,11 +741,12 @@ class UI(builder.Builder):
             self.doc.set_notes_after(self.notes_mode.direction() == 'page number')
 
         # Some things that need updating
-        self.cache.swap_document(self.doc)
+        self.cache.swap_document(self.doc, reloading)
         self.page_number.set_last(self.doc.pages_number())
-        self.page_number.enable_labels(self.doc.has_labels())
         self.medias.purge_media_overlays()
-        self.timing.set_document_metadata(self.doc.get_structure().copy(), self.doc.page_labels[:])
+        # Page numbers until all the labels are fetched, the timing report must not keep references to the document
+        self.timing.set_document_metadata({}, [str(n + 1) for n in range(len(self.doc.page_labels))])
+        self.search.set_document(self.doc)
 
         # A new document, restart at time 0, paused
         if not reloading:
@@ -665,11 +756,19 @@ class UI(builder.Builder):
 
         self.do_page_change(unpause=False)
 
+        # Read everything that is not needed to show the first page once it is drawn
+        GLib.idle_add(self.load_page_labels, self.doc)
+        GLib.idle_add(self.load_structure, self.doc)
+        if self.doc.get_uri() is not None:
+            GLib.idle_add(self.resolve_dests, self.doc, priority=GLib.PRIORITY_LOW)
+
         # Now that all references to the old document have been replaced or removed, manually
         # collect garbage to delete objects and release file handles / close file descriptors
         if run_gc:
             gc.collect(1)
 
+        return False
+
 
     def reload_document(self):
         """ Reload the current document.
@@ -677,6 +776,52 @@ class UI(builder.Builder):
         self.swap_document(self.doc.get_uri(), page=self.current_page, reloading=True)
 
 
+    def load_page_labels(self, doc):
+        """ Fetch a batch of page labels of the document, and enable labels once they are all known.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document whose labels we fetch
+
+        Returns:
+            `bool`: whether there are more labels to fetch in the current document
+        """
+        if doc is not self.doc:
+            return False
+
+        more = doc.load_labels()
+        if not more or doc.page_labels.custom:
+            self.page_number.enable_labels(doc.has_labels())
+        if not more:
+            self.timing.set_page_labels(list(doc.page_labels))
+        return more
+
+
+    def load_structure(self, doc):
+        """ Read the outline of the document, for the timing report.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document whose outline we read
+
+        Returns:
+            `bool`: `False`, to run only once (:func:`~GLib.idle_add` convention)
+        """
+        if doc is self.doc:
+            self.timing.set_document_structure(doc.get_structure().copy())
+        return False
+
+
+    def resolve_dests(self, doc):
+        """ Resolve named destinations of the document, scheduled repeatedly at low priority on the main loop.
+
+        Args:
+            doc (:class:`~pympress.document.Document`): the document whose destinations we resolve
+
+        Returns:
+            `bool`: whether there are more destinations to resolve in the current document
+        """
+        return doc is self.doc and doc.resolve_dests()
+
+
     def populate_recent_menu(self, gaction, is_opening=None):
         """ Callback for the recent document menu.
 
@@ -915,6 +1060,12 @@ class UI(builder.Builder):
         self.goto_page(self.doc.pages_number())
 
 
+    def show_overview(self, *args):
+        """ Show the grid of all slides, to pick one to go to.
+        """
+        self.slide_overview.show(self.doc, self.notes_mode.complement(), self.current_page)
+
+
     def do_page_change(self, unpause=True):
         """ Switch to another page and display it.
 
@@ -934,44 +1085,43 @@ class UI(builder.Builder):
 
         page_content = self.doc.page(self.current_page)
         page_preview = self.doc.page(self.preview_page)
-        page_next = self.doc.page(self.preview_page + 1)
-        page_notes = self.doc.notes_page(self.preview_page)
 
-        # Aspect ratios and queue redraws
+        # Aspect ratios (from the document’s table of page sizes, not to build the next and notes pages) and redraws
         if draw_notes:
-            note_pr = page_notes.get_aspect_ratio(draw_notes)
+            note_pr = self.doc.get_aspect_ratio(self.preview_page, draw_notes, notes = True)
             self.p_frame_notes.set_property('ratio', note_pr)
             self.p_da_notes.queue_draw()
 
-        preview_pr = page_preview.get_aspect_ratio(draw_page)
+        preview_pr = self.doc.get_aspect_ratio(self.preview_page, draw_page)
 
         self.p_frame_cur.set_property('ratio', preview_pr)
         self.p_da_cur.queue_draw()
 
         if not is_preview:
-            content_pr = page_content.get_aspect_ratio(draw_page)
+            content_pr = self.doc.get_aspect_ratio(self.current_page, draw_page)
             self.c_frame.set_property('ratio', content_pr)
             self.c_da.queue_draw()
 
             self.scribbler.scribble_p_frame.set_property('ratio', content_pr)
             self.scribbler.scribble_p_frame.queue_draw()
 
-        if page_next is not None:
-            next_pr = page_next.get_aspect_ratio(draw_notes)
+        next_pr = self.doc.get_aspect_ratio(self.preview_page + 1, draw_notes)
+        if next_pr is not None:
             self.p_frame_next.set_property('ratio', next_pr)
 
         self.p_da_next.queue_draw()
 
-        self.annotations.add_annotations(page_preview.get_annotations())
+        # Annotations are read from the page only if they are shown, see switch_annotations
+        if self.show_annotations:
+            self.annotations.add_annotations(page_preview.get_annotations())
 
         # Update display -- needs to be different ?
         self.page_number.update_page_numbers(self.preview_page, page_preview.label())
+        if not is_preview:
+            metrics.set_context(page = self.current_page + 1, label = page_content.label())
 
-        # Prerender the 4 next pages and the 2 previous ones
-        page_max = min(self.doc.pages_number(), self.preview_page + 5)
-        page_min = max(0, self.preview_page - 2)
-        for p in list(range(self.preview_page + 1, page_max)) + list(range(self.preview_page, page_min, -1)):
-            self.cache.prerender(p)
+        # Prerender the pages most likely to be shown next
+        self.cache.prerender_around(self.preview_page)
 
         if is_preview:
             return
@@ -991,6 +1141,7 @@ class UI(builder.Builder):
         self.timing.transition(self.preview_page, self.talk_time.current_time())
 
 
+    @metrics.timed('draw', lambda self, widget, cairo_context: widget.get_name())
     def on_draw(self, widget, cairo_context):
         """ Manage draw events for both windows.
 
@@ -1030,32 +1181,34 @@ class UI(builder.Builder):
         window = widget.get_window()
         scale = window.get_scale_factor()
 
-        if self.zoom.scale != 1. and (widget is self.p_da_cur or widget is self.c_da or
-                                      widget is self.scribbler.scribble_p_da):
+        zoomed = self.zoom.scale != 1. and (widget is self.p_da_cur or widget is self.c_da or
+                                            widget is self.scribbler.scribble_p_da)
+        if zoomed:
             zoom_matrix = self.zoom.get_matrix(ww, wh)
-            name += '_zoomed'
+            self.draw_zoomed(cairo_context, widget, name + '_zoomed', page, ww, wh, wtype)
+            pb = None
         else:
             zoom_matrix = cairo.Matrix()
+            pb = self.cache.get(name, nb)
 
-        pb = self.cache.get(name, nb)
-        if pb is None:
+        if pb is None and not zoomed:
             if self.resize_panes and widget in [self.p_da_next, self.p_da_cur, self.p_da_notes]:
                 # too slow to render here when resize_panes things
                 return
 
-            # Cache miss: render the page, and save it to the cache
-            pb = window.create_similar_image_surface(cairo.Format.RGB24, ww * scale, wh * scale, scale)
-
-            cairo_prerender = cairo.Context(pb)
-            cairo_prerender.transform(zoom_matrix)
-            page.render_cairo(cairo_prerender, ww, wh, wtype)
-
-            self.cache.set(name, nb, pb)
-
-            cairo_context.set_source_surface(pb, 0, 0)
-            cairo_context.paint()
-        else:
-            # Cache hit: draw the surface from the cache to the widget
+            elif self.progressive_render and self.cache.surface_size.get(name) == (ww, wh) and \
+                    nb < self.doc.pages_number():
+                # Cache miss: show a page we can get quickly, and render the full page as soon as possible.
+                # Pages of notes after the slides are not concerned, as the cache’s renderer only knows slides.
+                self.draw_placeholder(cairo_context, page, ww, wh, wtype)
+                self.cache.queue_render(name, nb, widget.queue_draw)
+            else:
+                # Cache miss: render the page, and save it to the cache
+                pb = window.create_similar_image_surface(cairo.Format.RGB24, ww * scale, wh * scale, scale)
+                render.render_page(page, pb, ww, wh, wtype)
+                self.cache.set(name, nb, pb)
+
+        if pb is not None:
             cairo_context.set_source_surface(pb, 0, 0)
             cairo_context.paint()
 
@@ -1073,12 +1226,101 @@ class UI(builder.Builder):
             self.laser.render_pointer(cairo_context, ww, wh)
 
 
-    def clear_zoom_cache(self):
-        """ Callback to clear the cache of zoomed widgets.
+    def draw_placeholder(self, cairo_context, page, ww, wh, wtype):
+        """ Draw a page quickly while it is not rendered at the right size, scaling a lower resolution rendering.
+
+        The page is taken from the cache of another widget if possible, otherwise it is rendered with
+        :attr:`low_res_factor` times fewer pixels in each direction, and kept by the cache’s
+        :class:`~pympress.render.PageRenderer`.
+
+        Args:
+            cairo_context (:class:`~cairo.Context`):  the Cairo context of the widget
+            page (:class:`~pympress.document.Page`):  the page to draw
+            ww (`int`):  width of the widget
+            wh (`int`):  height of the widget
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to draw
+        """
+        pb = self.cache.get_placeholder(page.number(), wtype)
+
+        if pb is None:
+            pb = self.cache.page_renderer.render(page, max(1, ww // self.low_res_factor),
+                                                 max(1, wh // self.low_res_factor), wtype)
+
+        self.cache.paint_scaled(cairo_context, pb, page.number(), wtype, (ww, wh))
+
+
+    def draw_zoomed(self, cairo_context, widget, name, page, ww, wh, wtype):
+        """ Draw the visible part of a zoomed page, from tiles of the page rendered at a power of two zoom level.
+
+        The zoom level is the smallest power of two that is at least the zoom scale, so that tiles are only scaled
+        down when drawn. Only the tiles that are visible are rendered, all at once from a single rendering of the
+        region they cover, and they are cached independently of the zoom’s exact scale and position,
+        so that zooming again on the same area or panning reuses them.
+
+        Args:
+            cairo_context (:class:`~cairo.Context`):  the Cairo context of the widget
+            widget (:class:`~Gtk.Widget`):  the widget to update
+            name (`str`):  the name of the zoomed widget in the cache
+            page (:class:`~pympress.document.Page`):  the page to draw
+            ww (`int`):  width of the widget
+            wh (`int`):  height of the widget
+            wtype (:class:`~pympress.document.PdfPage`):  the type of page to draw
         """
-        self.cache.clear_cache(self.c_da.get_name() + '_zoomed')
-        self.cache.clear_cache(self.p_da_cur.get_name() + '_zoomed')
-        self.cache.clear_cache(self.scribbler.scribble_p_da.get_name() + '_zoomed')
+        level = 2 ** max(0, math.ceil(math.log2(self.zoom.scale)))
+        tile = self.cache.tile_size
+        window = widget.get_window()
+        scale = window.get_scale_factor()
+
+        zoom_matrix = self.zoom.get_matrix(ww, wh)
+        inverse = self.zoom.get_matrix(ww, wh)
+        inverse.invert()
+
+        # Visible part of the widget, in the coordinates of the page scaled by level
+        x0, y0 = (level * c for c in inverse.transform_point(0, 0))
+        x1, y1 = (level * c for c in inverse.transform_point(ww, wh))
+        cols = range(max(0, int(x0 // tile)), min(math.ceil(ww * level / tile), int(x1 // tile) + 1))
+        rows = range(max(0, int(y0 // tile)), min(math.ceil(wh * level / tile), int(y1 // tile) + 1))
+
+        cairo_context.save()
+        cairo_context.transform(zoom_matrix)
+        cairo_context.scale(1 / level, 1 / level)
+        cairo_context.rectangle(0, 0, ww * level, wh * level)
+        cairo_context.clip()
+
+        tiles = {(col, row): self.cache.get_tile(name, (page.number(), (ww, wh), wtype, level, col, row, scale))
+                 for row in rows for col in cols}
+        missing = [pos for pos, pb in tiles.items() if pb is None]
+
+        if missing:
+            # Rasterize the region covering all missing tiles with a single Poppler pass, then slice it into tiles
+            col0, row0 = min(col for col, row in missing), min(row for col, row in missing)
+            ncols, nrows = max(col for col, row in missing) + 1 - col0, max(row for col, row in missing) + 1 - row0
+            region = window.create_similar_image_surface(cairo.Format.RGB24, ncols * tile * scale,
+                                                         nrows * tile * scale, scale)
+
+            cairo_prerender = cairo.Context(region)
+            cairo_prerender.translate(-col0 * tile, -row0 * tile)
+            cairo_prerender.scale(level, level)
+            page.render_cairo(cairo_prerender, ww, wh, wtype)
+            del cairo_prerender
+
+            for col, row in missing:
+                pb = window.create_similar_image_surface(cairo.Format.RGB24, tile * scale, tile * scale, scale)
+                cairo_slice = cairo.Context(pb)
+                cairo_slice.set_source_surface(region, (col0 - col) * tile, (row0 - row) * tile)
+                cairo_slice.paint()
+                del cairo_slice
+
+                tiles[col, row] = pb
+                self.cache.set_tile(name, (page.number(), (ww, wh), wtype, level, col, row, scale), pb)
+
+        for (col, row), pb in tiles.items():
+            cairo_context.set_source_surface(pb, col * tile, row * tile)
+            cairo_context.get_source().set_extend(cairo.Extend.PAD)
+            cairo_context.rectangle(col * tile, row * tile, tile, tile)
+            cairo_context.fill()
+
+        cairo_context.restore()
 
 
     def redraw_current_slide(self):
@@ -1284,6 +1526,7 @@ class UI(builder.Builder):
         x, y = self.zoom.get_slide_point(widget, event)
         page_mode = self.notes_mode if widget is self.p_da_notes else self.notes_mode.complement()
 
+        # Only the links overlapping the hovered cell of the page's link grid are tested
         if page.get_link_at(x, y, page_mode):
             extras.Cursor.set_cursor(widget, 'pointer')
             return False
@@ -240,6 +240,26 @@ def get_log_path():
     return os.path.join(base_dir, 'pympress.log')
 
 
+def get_cache_path():
+    """ Returns the appropriate path to the directory where pympress caches data, in the user app dirs.
+
+    Returns:
+        `str`: path to the cache directory.
+    """
+    if IS_WINDOWS:
+        base_dir = os.getenv('LOCALAPPDATA', os.getenv('APPDATA'))
+    elif IS_MAC_OS:
+        base_dir = os.path.expanduser('~/Library/Caches')
+    else:
+        base_dir = os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+
+    cache_dir = os.path.join(base_dir, 'pympress')
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    return cache_dir
+
+
 def fileopen(f):
     """ Call the right function to open files, based on the platform.
 